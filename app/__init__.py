@@ -1,17 +1,23 @@
+import hmac
+import json
 import os
 from http import HTTPStatus
 
-from beanie import init_beanie
-from fastapi import APIRouter, FastAPI
+from fastapi import APIRouter, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import ValidationError
-from pymongo.database import Database
 
+from app.access_log import AccessLogMiddleware
 from app.config import Config
-from app.models.documents import PostDocument, UserDocument
+from app.database import init_database
+from app.providers.use_access_log import use_access_log
 from app.providers.use_config import use_config
+from app.providers.use_live_feed import use_live_feed
+from app.providers.use_metrics import use_metrics
+from app.providers.use_response_cache import use_response_cache
+from app.providers.use_user_deleter import use_user_deleter
+from app.providers.use_view_counter import use_view_counter
 from app.routers.posts_router import posts_router
 from app.routers.users_router import users_router
 
@@ -32,6 +38,9 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+# Added last so the time spent in the other middlewares is also logged.
+app.add_middleware(AccessLogMiddleware, get_access_log=use_access_log)
+
 # Respond with the correct format for pydantic validator errors.
 # See https://github.com/tiangolo/fastapi/issues/1474
 @app.exception_handler(ValidationError)
@@ -47,9 +56,40 @@ async def validation_exception_handler(_, exception: ValidationError):
 @app.on_event("startup")
 async def init():
     config: Config = use_config()
-    client = AsyncIOMotorClient(config.database.url, uuidRepresentation="standard")
-    database: Database = client[config.database.name]
-    await init_beanie(database=database, document_models=[UserDocument, PostDocument])
+    use_access_log().start()
+    database = await init_database(config.database)
+
+    # Warm up before accepting traffic, so the first requests served by a new
+    # worker don't pay for connecting to the database or building the schema.
+    await database.command("ping")
+    app.openapi()
+
+    # Resume the user deletions interrupted by a previous shutdown.
+    use_user_deleter().ensure_sweeping()
+    use_response_cache().ensure_listening()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await use_live_feed().close()
+    await use_view_counter().close()
+    await use_user_deleter().close()
+    await use_response_cache().close()
+    use_access_log().stop()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: str | None = Header(default=None)):
+    token = use_config().metrics.token
+
+    # The internal counters aren't public, the endpoint doesn't exist for clients
+    # without the token or when none is configured.
+    if not token or not hmac.compare_digest(
+        (authorization or "").encode(), f"Bearer {token}".encode()
+    ):
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+
+    return use_metrics().snapshot()
 
 
 router = APIRouter(prefix="/v1")
@@ -57,3 +97,20 @@ router.include_router(posts_router, prefix="/posts", tags=["posts"])
 router.include_router(users_router, prefix="/users", tags=["users"])
 
 app.include_router(router)
+
+
+def openapi():
+    """
+    Serve the schema generated at build time by `app.tools.openapi` when available
+    instead of generating it on the first request.
+    """
+    schema_path = os.environ.get("OPENAPI_SCHEMA_PATH")
+
+    if app.openapi_schema is None and schema_path and os.path.exists(schema_path):
+        with open(schema_path, encoding="utf-8") as file:
+            app.openapi_schema = json.load(file)
+
+    return FastAPI.openapi(app)
+
+
+app.openapi = openapi
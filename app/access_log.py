@@ -0,0 +1,192 @@
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable
+
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import AccessLogConfig
+from app.metrics import Metrics
+
+
+@dataclass
+class RequestStats:
+    mongo_time: float = 0  # seconds
+    mongo_commands: int = 0
+
+
+request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Adds the time spent on database commands to the stats of the current request.
+    Motor runs the commands on a thread pool with a copy of the caller's context,
+    so the stats object set by the middleware is shared with the request.
+    """
+
+    def record(self, duration_micros: int):
+        stats = request_stats.get()
+
+        if stats is not None:
+            stats.mongo_time += duration_micros / 1_000_000
+            stats.mongo_commands += 1
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.record(event.duration_micros)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.record(event.duration_micros)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        created_at = datetime.fromtimestamp(record.created, timezone.utc)
+        return json.dumps({"time": created_at.isoformat(), **record.msg})
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler which never blocks the event loop: entries are formatted by the
+    listener thread and dropped when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue, metrics: Metrics) -> None:
+        super().__init__(log_queue)
+        self.metrics = metrics
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.metrics.increment("access_log_dropped")
+
+
+class AccessLog:
+    """
+    Structured log of the handled requests, written as one JSON object per line
+    by a background thread.
+    """
+
+    def __init__(
+        self,
+        config: AccessLogConfig,
+        metrics: Metrics,
+        handler: logging.Handler | None = None,
+    ) -> None:
+        self.config = config
+        self.started = False
+
+        if handler is None:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(config.queue_size)
+        self.listener = QueueListener(log_queue, handler)
+
+        self.logger = logging.getLogger("app.access")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [DroppingQueueHandler(log_queue, metrics)]
+
+    def start(self):
+        if not self.started:
+            self.listener.start()
+            self.started = True
+
+    def stop(self):
+        # Waits for the queued entries to be written.
+        if self.started:
+            self.listener.stop()
+            self.started = False
+
+    def is_sampled(self, status: int, latency: float) -> bool | None:
+        """
+        Whether the request is logged because it was sampled, `None` when it is
+        not logged at all.
+        """
+        if status >= HTTPStatus.BAD_REQUEST or latency >= self.config.slow_threshold:
+            return False
+
+        return True if random.random() < self.config.sample_rate else None
+
+    def log(self, entry: dict):
+        self.logger.info(entry)
+
+
+class AccessLogMiddleware:
+    """
+    Logs the route, status, latency, database time, user and response size of
+    the requests to the `AccessLog` returned by `get_access_log`. The logged user
+    is read from `request.state.user_id`.
+    """
+
+    def __init__(self, app: ASGIApp, get_access_log: Callable[[], AccessLog]) -> None:
+        self.app = app
+        self.get_access_log = get_access_log
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        access_log = self.get_access_log()
+
+        if scope["type"] != "http" or not access_log.config.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = HTTPStatus.INTERNAL_SERVER_ERROR.value
+        size = 0
+
+        async def send_with_stats(message: Message):
+            nonlocal status, size
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            request_stats.reset(token)
+            latency = time.perf_counter() - started_at
+
+            sampled = access_log.is_sampled(status, latency)
+
+            if sampled is not None:
+                endpoint = scope.get("endpoint")
+
+                access_log.log(
+                    {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": endpoint.__name__ if endpoint else None,
+                        "status": status,
+                        "latencyMs": round(latency * 1000, 3),
+                        "mongoMs": round(stats.mongo_time * 1000, 3),
+                        "mongoCommands": stats.mongo_commands,
+                        "userId": scope.get("state", {}).get("user_id"),
+                        "responseBytes": size,
+                        "sampled": sampled,
+                    }
+                )
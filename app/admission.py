@@ -0,0 +1,127 @@
+import math
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+
+from fastapi import HTTPException
+
+from app.config import PasswordConfig
+from app.metrics import Metrics
+
+# Upper bound to the number of clients and accounts tracked at the same time, the
+# least recently seen ones are forgotten first.
+MAX_TRACKED_KEYS = 10_000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token from the bucket, returning 0 on success or the number of
+        seconds to wait for the next token when the bucket is empty.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+
+        self.tokens -= 1
+        return 0
+
+
+class AdmissionController:
+    """
+    Admission control for CPU heavy password operations. Requests exceeding the
+    limits are rejected before doing any work with a `Retry-After` header.
+    """
+
+    def __init__(self, config: PasswordConfig, metrics: Metrics) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.in_flight = 0
+        self.in_flight_by_key: Counter[str] = Counter()
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+        metrics.register_gauge("password_operations_in_flight", lambda: self.in_flight)
+
+    def reject(self, reason: str, status_code: HTTPStatus, retry_after: float):
+        self.metrics.increment(f"password_operations_rejected_{reason}")
+
+        raise HTTPException(
+            status_code=status_code,
+            detail="Too many password operations, please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def take_token(self, key: str, rate: float, burst: int) -> float:
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+
+            if len(self.buckets) > MAX_TRACKED_KEYS:
+                self.buckets.popitem(last=False)
+
+        self.buckets.move_to_end(key)
+        return bucket.take()
+
+    @asynccontextmanager
+    async def admit(self, client: str | None, account: str | None):
+        config = self.config
+
+        if self.in_flight >= config.max_concurrency:
+            self.reject("overload", HTTPStatus.SERVICE_UNAVAILABLE, config.retry_after)
+
+        limits = []
+
+        if client:
+            limits.append(
+                (
+                    "client",
+                    f"client:{client}",
+                    config.client_concurrency,
+                    config.client_rate,
+                    config.client_burst,
+                )
+            )
+        if account:
+            limits.append(
+                (
+                    "account",
+                    f"account:{account.lower()}",
+                    config.account_concurrency,
+                    config.account_rate,
+                    config.account_burst,
+                )
+            )
+
+        for reason, key, concurrency, rate, burst in limits:
+            if self.in_flight_by_key[key] >= concurrency:
+                self.reject(reason, HTTPStatus.TOO_MANY_REQUESTS, config.retry_after)
+
+            retry_after = self.take_token(key, rate, burst)
+
+            if retry_after:
+                self.reject(reason, HTTPStatus.TOO_MANY_REQUESTS, retry_after)
+
+        keys = [key for _, key, *_ in limits]
+        self.in_flight += 1
+        self.in_flight_by_key.update(keys)
+
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.in_flight_by_key.subtract(keys)
+
+            for key in keys:
+                if self.in_flight_by_key[key] <= 0:
+                    del self.in_flight_by_key[key]
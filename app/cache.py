@@ -0,0 +1,359 @@
+import asyncio
+import contextvars
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlparse
+from uuid import UUID
+
+from app.metrics import Metrics
+
+# Invalidations are sent as newline separated keys in a single datagram.
+MAX_INVALIDATION_SIZE = 64 * 1024
+
+
+def post_cache_key(post_id: str) -> str:
+    return f"post:{post_id}"
+
+
+def user_cache_key(user_id: UUID) -> str:
+    return f"user:{user_id}"
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache, entries are evicted when expired or when full."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.entries.pop(key, None)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache stored on a server speaking the Redis protocol (RESP), shared by all the
+    instances of the application. Only the few commands we need are implemented
+    so we don't depend on a client library.
+    """
+
+    def __init__(self, url: str, pool_size: int) -> None:
+        parsed = urlparse(url)
+
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.lstrip("/") or 0)
+        self.pool_size = pool_size
+        self.pool: asyncio.Queue = asyncio.Queue()
+        self.connections = 0
+
+    async def connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        connection = await asyncio.open_connection(self.host, self.port)
+
+        if self.password:
+            await self.send(connection, "AUTH", self.password)
+        if self.database:
+            await self.send(connection, "SELECT", self.database)
+
+        return connection
+
+    @staticmethod
+    async def read_reply(reader: asyncio.StreamReader) -> Any:
+        line = await reader.readuntil(b"\r\n")
+        prefix, payload = line[:1], line[1:-2]
+
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RedisError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await RedisCacheBackend.read_reply(reader) for _ in range(length)]
+
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    @staticmethod
+    async def send(connection, *args: Any) -> Any:
+        reader, writer = connection
+        parts = [f"*{len(args)}\r\n".encode()]
+
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts += [f"${len(data)}\r\n".encode(), data, b"\r\n"]
+
+        writer.write(b"".join(parts))
+        await writer.drain()
+
+        return await RedisCacheBackend.read_reply(reader)
+
+    async def execute(self, *args: Any) -> Any:
+        if self.pool.empty() and self.connections < self.pool_size:
+            self.connections += 1
+
+            try:
+                connection = await self.connect()
+            except BaseException:
+                self.connections -= 1
+                raise
+        else:
+            connection = await self.pool.get()
+
+        try:
+            result = await self.send(connection, *args)
+        except BaseException:
+            # The connection might be left in an inconsistent state.
+            self.connections -= 1
+            connection[1].close()
+            raise
+
+        self.pool.put_nowait(connection)
+        return result
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.execute("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        await self.execute("DEL", *keys)
+
+
+class InvalidationBroadcast:
+    """
+    Sends the invalidated keys to the other processes sharing `directory`, each
+    one receiving them on its own Unix datagram socket in it. Used by the workers
+    of `app.serve`, so the memory backend of a worker doesn't keep serving the
+    entries invalidated by another one.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+
+        # Left behind by a crashed process with the same pid.
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(self.path)
+
+    def send(self, keys: tuple[str, ...]) -> int:
+        """Send the keys to the other processes, returns how many missed them."""
+        message = "\n".join(keys).encode()
+        missed = 0
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+
+            if path == self.path:
+                continue
+
+            try:
+                self.sock.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The process exited without removing its socket.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                # The queue of the process is full.
+                missed += 1
+
+        return missed
+
+    async def receive(self) -> list[str]:
+        loop = asyncio.get_running_loop()
+        message = await loop.sock_recv(self.sock, MAX_INVALIDATION_SIZE)
+        return message.decode().split("\n")
+
+    def close(self):
+        self.sock.close()
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class ResponseCache:
+    """
+    Cache of serialized responses. Concurrent misses on the same key are collapsed
+    into a single load, which is discarded if the key is invalidated meanwhile and
+    taken over by one of the waiters if the request loading it is cancelled.
+    """
+
+    def __init__(self, backend: CacheBackend, metrics: Metrics) -> None:
+        self.backend = backend
+        self.metrics = metrics
+        self.loading: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.broadcast: InvalidationBroadcast | None = None
+        self.listener: asyncio.Task | None = None
+
+        metrics.register_gauge("cache_hit_rate", self.hit_rate)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get(self, key: str) -> bytes | None:
+        kind = key.split(":", 1)[0]
+
+        try:
+            value = await self.backend.get(key)
+        except (OSError, RedisError):
+            # An unavailable cache shouldn't take the application down with it.
+            self.metrics.increment("cache_errors")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            self.metrics.increment(f"cache_{kind}_misses")
+        else:
+            self.hits += 1
+            self.metrics.increment(f"cache_{kind}_hits")
+
+        return value
+
+    async def get_or_load(
+        self, key: str, load: Callable[[], Awaitable[bytes | None]], ttl: float
+    ) -> bytes | None:
+        value = await self.get(key)
+
+        if value is not None:
+            return value
+
+        while (loading := self.loading.get(key)) is not None:
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                # When only the request loading the value was cancelled, the first
+                # waiter takes over the load instead of failing along with it.
+                if not loading.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exception:
+            future.set_exception(exception)
+            future.exception()  # Avoid warnings when nobody is waiting.
+            raise
+        finally:
+            if self.loading.get(key) is future:
+                del self.loading[key]
+                invalidated = False
+            else:
+                invalidated = True
+
+        if value is not None and not invalidated:
+            try:
+                await self.backend.set(key, value, ttl)
+            except (OSError, RedisError):
+                self.metrics.increment("cache_errors")
+
+        future.set_result(value)
+        return value
+
+    async def invalidate(self, *keys: str):
+        for key in keys:
+            self.loading.pop(key, None)
+
+        try:
+            await self.backend.delete(*keys)
+        except (OSError, RedisError):
+            # The change has already been saved, failing the request would only
+            # make the client retry it. The entries expire after their TTL.
+            self.metrics.increment("cache_errors")
+
+        if self.broadcast and (missed := self.broadcast.send(keys)):
+            self.metrics.increment("cache_invalidations_missed", missed)
+
+    def share_invalidations(self, broadcast: InvalidationBroadcast):
+        """Apply the invalidations of the other processes of the broadcast."""
+        self.broadcast = broadcast
+
+    def ensure_listening(self):
+        if self.broadcast and (self.listener is None or self.listener.done()):
+            self.listener = asyncio.create_task(
+                self.listen(), context=contextvars.Context()
+            )
+
+    async def listen(self):
+        while True:
+            keys = await self.broadcast.receive()
+
+            for key in keys:
+                self.loading.pop(key, None)
+
+            await self.backend.delete(*keys)
+
+    async def close(self):
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.wait([self.listener])
+
+        if self.broadcast:
+            self.broadcast.close()
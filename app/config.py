@@ -1,5 +1,7 @@
+from typing import Literal, Optional
+
 import pydantic
-from pydantic import AnyUrl, EmailStr, conint
+from pydantic import AnyUrl, EmailStr, Field, confloat, conint
 
 
 class JwtConfig(pydantic.BaseSettings):
@@ -16,6 +18,9 @@ class JwtConfig(pydantic.BaseSettings):
 class DatabaseConfig(pydantic.BaseSettings):
     url: AnyUrl
     name: str
+    # When disabled the indexes are not synchronized on startup to speed up cold
+    # starts and must be created by running `python -m app.tools.migrate` instead.
+    sync_indexes: bool = True
 
     class Config:
         env_prefix = "DATABASE_"
@@ -35,6 +40,148 @@ class EmailConfig(pydantic.BaseSettings):
         env_prefix = "EMAIL_"
 
 
+class PasswordConfig(pydantic.BaseSettings):
+    # Work factor of new password hashes, existing hashes are upgraded on login.
+    # See `python -m app.tools.calibrate_bcrypt` to pick a value for the hardware.
+    bcrypt_rounds: conint(ge=4, le=31) = 12
+
+    # Password hashing is CPU heavy, so the number of concurrent operations is
+    # capped globally, per client and per account. Clients and accounts are also
+    # rate limited using a token bucket refilled at `*_rate` tokens per second.
+    max_concurrency: conint(gt=0) = 8
+    client_concurrency: conint(gt=0) = 2
+    client_rate: confloat(gt=0) = 5
+    client_burst: conint(gt=0) = 30
+    account_concurrency: conint(gt=0) = 1
+    account_rate: confloat(gt=0) = 1
+    account_burst: conint(gt=0) = 10
+    retry_after: conint(gt=0) = 1  # seconds
+
+    class Config:
+        env_prefix = "PASSWORD_"
+
+
+class CacheConfig(pydantic.BaseSettings):
+    # The memory backend is local to each instance, so entries invalidated by
+    # another instance can be served until they expire. Use the redis backend
+    # to share the cache between instances.
+    backend: Literal["memory", "redis"] = "memory"
+    url: Optional[AnyUrl]
+    pool_size: conint(gt=0) = 8
+    max_entries: conint(gt=0) = 10_000
+    post_ttl: confloat(gt=0) = 30  # seconds
+    user_ttl: confloat(gt=0) = 30  # seconds
+
+    class Config:
+        env_prefix = "CACHE_"
+
+
+class PostsConfig(pydantic.BaseSettings):
+    # Every n-th revision of a post is stored as a full snapshot instead of a
+    # delta, which bounds the number of deltas applied to rebuild a revision.
+    revision_snapshot_interval: conint(gt=0) = 20
+    # How long clients and CDNs may cache the raw content of a post.
+    raw_max_age: conint(ge=0) = 60  # seconds
+    # Number of characters of the content stored as the preview of a post.
+    preview_length: conint(ge=0) = 200
+
+    class Config:
+        env_prefix = "POSTS_"
+
+
+class ViewsConfig(pydantic.BaseSettings):
+    # How often the views counted by each instance are added to the posts.
+    flush_interval: confloat(gt=0) = 10  # seconds
+    # Posts with views waiting to be flushed, the views of other posts are
+    # dropped when reached and the views are flushed early.
+    max_pending: conint(gt=0) = 10_000
+
+    class Config:
+        env_prefix = "VIEWS_"
+
+
+class UserDeletionConfig(pydantic.BaseSettings):
+    # Posts deleted per query when deleting the content of a deleted user.
+    batch_size: conint(gt=0) = 500
+    # Deletions not making progress for this long are resumed by another instance,
+    # which also checks this often for such deletions.
+    lease_timeout: conint(gt=0) = 60  # seconds
+
+    class Config:
+        env_prefix = "USER_DELETION_"
+
+
+class LiveConfig(pydantic.BaseSettings):
+    # Events buffered per client, clients falling further behind are disconnected.
+    buffer_size: conint(gt=0) = 100
+    # Recent events kept in memory for clients resuming after a reconnection.
+    history_size: conint(gt=0) = 1000
+    heartbeat: confloat(gt=0) = 15  # seconds
+    max_subscribers: conint(gt=0) = 1000
+
+    class Config:
+        env_prefix = "LIVE_"
+
+
+class DeadlineConfig(pydantic.BaseSettings):
+    # Maximum time in seconds to handle a request, also applied to the database
+    # operations performed meanwhile. Routes can be given a different deadline
+    # by name, e.g. DEADLINE_ROUTES='{"get_posts": 2}', 0 disables it.
+    default: confloat(ge=0) = 10
+    routes: dict[str, confloat(ge=0)] = {}
+
+    class Config:
+        env_prefix = "DEADLINE_"
+
+
+class IdempotencyConfig(pydantic.BaseSettings):
+    # How long the response to a request sent with an `Idempotency-Key` header is
+    # replayed to the retries of that request.
+    ttl: conint(gt=0) = 86_400  # seconds
+    # Requests still in progress after this long are considered abandoned, so a
+    # retry can run them again.
+    lock_timeout: conint(gt=0) = 60  # seconds
+    # Completed responses kept in memory to answer retries without a query.
+    cache_entries: conint(gt=0) = 10_000
+
+    class Config:
+        env_prefix = "IDEMPOTENCY_"
+
+
+class AccessLogConfig(pydantic.BaseSettings):
+    enabled: bool = True
+    # Share of the successful requests logged, requests failing or slower than
+    # `slow_threshold` are always logged.
+    sample_rate: confloat(ge=0, le=1) = 0.1
+    slow_threshold: confloat(ge=0) = 1  # seconds
+    # Entries waiting to be written, new entries are dropped when it is full.
+    queue_size: conint(gt=0) = 10_000
+
+    class Config:
+        env_prefix = "ACCESS_LOG_"
+
+
+class MetricsConfig(pydantic.BaseSettings):
+    # Bearer token required to read `/metrics`, which is disabled when unset.
+    token: Optional[str]
+
+    class Config:
+        env_prefix = "METRICS_"
+
+
+class ServerConfig(pydantic.BaseSettings):
+    # Number of worker processes started by `python -m app.serve`, defaults to the
+    # number of CPUs available to the process.
+    workers: Optional[conint(gt=0)]
+    # Workers are gracefully replaced after serving `max_requests` requests plus a
+    # random jitter, so they don't all restart at once. Disabled when 0.
+    max_requests: conint(ge=0) = 0
+    max_requests_jitter: conint(ge=0) = 0
+
+    class Config:
+        env_prefix = "SERVER_"
+
+
 class WebsiteConfig(pydantic.BaseSettings):
     base_url: AnyUrl
 
@@ -43,7 +190,20 @@ class WebsiteConfig(pydantic.BaseSettings):
 
 
 class Config(pydantic.BaseSettings):
-    website = WebsiteConfig()
-    jwt = JwtConfig()
-    database = DatabaseConfig()
-    email = EmailConfig()
+    # Sub-settings are read when the configuration is first requested rather than
+    # when the module is imported.
+    website: WebsiteConfig = Field(default_factory=WebsiteConfig)
+    jwt: JwtConfig = Field(default_factory=JwtConfig)
+    database: DatabaseConfig = Field(default_factory=DatabaseConfig)
+    email: EmailConfig = Field(default_factory=EmailConfig)
+    password: PasswordConfig = Field(default_factory=PasswordConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    posts: PostsConfig = Field(default_factory=PostsConfig)
+    views: ViewsConfig = Field(default_factory=ViewsConfig)
+    user_deletion: UserDeletionConfig = Field(default_factory=UserDeletionConfig)
+    deadline: DeadlineConfig = Field(default_factory=DeadlineConfig)
+    live: LiveConfig = Field(default_factory=LiveConfig)
+    idempotency: IdempotencyConfig = Field(default_factory=IdempotencyConfig)
+    access_log: AccessLogConfig = Field(default_factory=AccessLogConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
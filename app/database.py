@@ -0,0 +1,45 @@
+from beanie import init_beanie
+from beanie.odm.utils.init import Initializer
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.database import Database
+
+from app.access_log import MongoCommandTimer
+from app.config import DatabaseConfig
+from app.models.documents import DOCUMENT_MODELS
+
+
+class DeferredIndexesInitializer(Initializer):
+    """Beanie initializer leaving the index synchronization to `app.tools.migrate`."""
+
+    @staticmethod
+    async def init_indexes(*_, **__):
+        return None
+
+
+async def init_database(
+    config: DatabaseConfig,
+    sync_indexes: bool | None = None,
+    allow_index_dropping: bool = False,
+) -> Database:
+    client = AsyncIOMotorClient(
+        config.url,
+        uuidRepresentation="standard",
+        event_listeners=[MongoCommandTimer()],
+    )
+    database: Database = client[config.name]
+
+    if sync_indexes is None:
+        sync_indexes = config.sync_indexes
+
+    if sync_indexes:
+        await init_beanie(
+            database=database,
+            document_models=DOCUMENT_MODELS,
+            allow_index_dropping=allow_index_dropping,
+        )
+    else:
+        await DeferredIndexesInitializer(
+            database=database, document_models=DOCUMENT_MODELS
+        )
+
+    return database
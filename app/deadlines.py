@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+from http import HTTPStatus
+from typing import Any, Callable, Coroutine, TypeVar
+
+import pymongo
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from pymongo.errors import PyMongoError
+
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+# Non-standard status used by proxies to log requests closed by the client, the
+# response is never actually received.
+CLIENT_CLOSED_REQUEST = 499
+
+Handler = Callable[[Request], Coroutine[Any, Any, Response]]
+
+T = TypeVar("T")
+
+# Writes running past the deadline of their request, kept to not be garbage
+# collected.
+detached_tasks: set[asyncio.Task] = set()
+
+
+async def wait_for_disconnect(request: Request):
+    # The body has already been read, so the only message left is the disconnect.
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def run_past_deadline(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a write which has to complete once the request made others, e.g. storing
+    the revision of an updated post. It runs in an empty context so the request
+    deadline (and its `pymongo.timeout`) isn't inherited, and keeps running when
+    the request is cancelled.
+    """
+    task = asyncio.create_task(coroutine, context=contextvars.Context())
+    detached_tasks.add(task)
+    task.add_done_callback(detached_tasks.discard)
+
+    return await asyncio.shield(task)
+
+
+async def run_with_deadline(
+    handler: Handler, request: Request, name: str, deadline: float | None
+) -> Response:
+    if not deadline:
+        return await handler(request)
+
+    try:
+        # Every Mongo operation started within the block gets the remaining time
+        # as `maxTimeMS`, so the server also gives up on it.
+        with pymongo.timeout(deadline):
+            return await asyncio.wait_for(handler(request), deadline)
+    except (asyncio.TimeoutError, PyMongoError) as exception:
+        if isinstance(exception, PyMongoError) and not exception.timeout:
+            raise
+
+        use_metrics().increment(f"requests_deadline_exceeded_{name}")
+
+        raise HTTPException(
+            status_code=HTTPStatus.GATEWAY_TIMEOUT,
+            detail="The request took too long to complete.",
+        ) from exception
+
+
+class DeadlineRoute(APIRoute):
+    """
+    Route bounding the time its handler can run for, see `DeadlineConfig`. The
+    handler is also cancelled, along with its pending queries, when the client
+    disconnects before the response is ready.
+    """
+
+    def get_route_handler(self) -> Handler:
+        handler = super().get_route_handler()
+        name = self.name
+
+        async def deadline_handler(request: Request) -> Response:
+            config = use_config().deadline
+            deadline = config.routes.get(name, config.default)
+
+            # Read the body beforehand so it isn't mistaken for a disconnect.
+            await request.body()
+
+            handler_task = asyncio.create_task(
+                run_with_deadline(handler, request, name, deadline)
+            )
+            disconnect_task = asyncio.create_task(wait_for_disconnect(request))
+
+            try:
+                done, _ = await asyncio.wait(
+                    [handler_task, disconnect_task],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            except asyncio.CancelledError:
+                handler_task.cancel()
+                disconnect_task.cancel()
+                raise
+
+            disconnect_task.cancel()
+
+            if handler_task not in done:
+                handler_task.cancel()
+                await asyncio.wait([handler_task])
+
+                use_metrics().increment(f"requests_disconnected_{name}")
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+            return handler_task.result()
+
+        return deadline_handler
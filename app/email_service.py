@@ -1,11 +1,11 @@
-import smtplib
-from email.message import EmailMessage
 from typing import TypedDict
 
-from jinja2 import Environment, FileSystemLoader
-
 from app.config import EmailConfig
 
+# smtplib and jinja2 are only imported when the service is first used to keep the
+# application startup fast.
+# pylint: disable=import-outside-toplevel
+
 
 class SendEmailArgs(TypedDict):
     subject: str
@@ -16,6 +16,10 @@ class SendEmailArgs(TypedDict):
 
 class EmailService:
     def __init__(self, config: EmailConfig) -> None:
+        import smtplib
+
+        from jinja2 import Environment, FileSystemLoader
+
         self.config = config
         self.smtp = smtplib.SMTP(host=config.smtp_host, port=config.smtp_port)
 
@@ -29,6 +33,8 @@ class EmailService:
         self.smtp.quit()
 
     def send_email(self, **args: SendEmailArgs):
+        from email.message import EmailMessage
+
         template = self.environment.get_template(args["template"])
         content = template.render(args["variables"])
 
@@ -0,0 +1,82 @@
+import json
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from fastapi import Query
+from pydantic import BaseModel, Field, create_model
+
+# Response fields stored under a different name in the documents.
+DOCUMENT_FIELDS = {"creatorId": "creator"}
+
+Fields = list[str] | None
+
+
+def fields_query(model: type[BaseModel]) -> Callable:
+    """
+    Dependency parsing the `fields` query parameter, a comma separated list of
+    the fields of `model` to respond with. The pattern lists the allowed fields
+    so they are part of the OpenAPI schema.
+    """
+    field = f"({'|'.join(model.__fields__)})"
+
+    def parse_fields(
+        fields: str
+        | None = Query(
+            default=None,
+            regex=f"^{field}(,{field})*$",
+            description="Only respond with the given comma separated fields.",
+        )
+    ) -> Fields:
+        return list(dict.fromkeys(fields.split(","))) if fields else None
+
+    return parse_fields
+
+
+def partial_model(model: type[BaseModel]) -> type[BaseModel]:
+    """
+    Variant of `model` where every field is optional, documenting the responses
+    trimmed to the requested `fields` in the OpenAPI schema.
+    """
+    definitions = {
+        name: (Optional[field.outer_type_], None)
+        for name, field in model.__fields__.items()
+    }
+
+    return create_model(f"Partial{model.__name__}", **definitions)
+
+
+@lru_cache(maxsize=256)
+def projection_model(
+    document: type[BaseModel], fields: tuple[str, ...]
+) -> type[BaseModel]:
+    """
+    Projection fetching just the document fields behind the given response fields,
+    with the same defaults as the document for fields missing from older ones.
+    """
+    definitions = {}
+
+    for name in fields:
+        field = document.__fields__[DOCUMENT_FIELDS.get(name, name)]
+        definitions[name] = (Any, Field(default=field.default, alias=field.alias))
+
+    return create_model(f"{document.__name__}Projection", **definitions)
+
+
+def construct_partial(model: type[BaseModel], projection: BaseModel) -> BaseModel:
+    """
+    Build a response from a `projection_model` without validating it, since the
+    fields which weren't fetched are missing. Those are left out of the response
+    by only including the requested fields when serializing it.
+    """
+    values = projection.dict()
+
+    if values.get("creatorId") is not None:
+        values["creatorId"] = values["creatorId"].id
+
+    return model.construct(**values)
+
+
+def trim_json(content: bytes, fields: list[str]) -> dict:
+    """Only keep the given fields of a serialized response."""
+    data = json.loads(content)
+    return {name: data[name] for name in fields if name in data}
@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.cache import MemoryCacheBackend
+from app.config import IdempotencyConfig
+from app.deadlines import run_past_deadline
+from app.metrics import Metrics
+from app.models.documents import IdempotencyRecordDocument, IdempotentResponse
+
+logger = logging.getLogger(__name__)
+
+# Responses telling the client to retry later release the key instead of being
+# replayed, as would server errors.
+TRANSIENT_STATUSES = {
+    HTTPStatus.REQUEST_TIMEOUT,
+    HTTPStatus.CONFLICT,
+    HTTPStatus.TOO_MANY_REQUESTS,
+}
+
+# Headers set again when the stored content is replayed.
+CONTENT_HEADERS = {"content-length", "content-type"}
+
+
+def request_fingerprint(body: BaseModel, secret: str | None = None) -> str:
+    """
+    Digest of a request body, keyed with `secret` when the body holds credentials
+    so they can't be guessed from the stored fingerprint.
+    """
+    content = body.json().encode()
+
+    if secret:
+        return hmac.new(secret.encode(), content, hashlib.sha256).hexdigest()
+
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def is_transient(status_code: int) -> bool:
+    return (
+        status_code in TRANSIENT_STATUSES
+        or status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+
+
+class IdempotencyStore:
+    """
+    Runs a request at most once per idempotency key, retries get the response of
+    the first request instead. Keys are scoped per endpoint and to something the
+    client controls (the logged user, or the email of the account created), and
+    reusing a key with a different request body is rejected. Successful responses
+    and client errors are stored, server errors and transient errors (e.g. rate
+    limiting) release the key so the request can be retried.
+    """
+
+    def __init__(self, config: IdempotencyConfig, metrics: Metrics) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.cache = MemoryCacheBackend(config.cache_entries)
+        # Keys released in the background, kept to not be garbage collected.
+        self.releasing: set[asyncio.Task] = set()
+
+    async def run(
+        self,
+        scope: str,
+        key: str | None,
+        fingerprint: str,
+        handler: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        if key is None:
+            return await handler()
+
+        record_id = f"{scope}:{key}"
+        record = await self.acquire(record_id, fingerprint)
+
+        if record:
+            self.metrics.increment("idempotent_replays")
+            return Response(
+                content=record.content,
+                status_code=record.statusCode,
+                media_type="application/json",
+                headers={**record.headers, "Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = await handler()
+        except HTTPException as exception:
+            if is_transient(exception.status_code):
+                self.release(record_id)
+                raise
+
+            content = json.dumps({"detail": exception.detail})
+            await self.complete(
+                record_id,
+                self.build_record(
+                    fingerprint, exception.status_code, content, exception.headers
+                ),
+            )
+            raise
+        except BaseException:
+            self.release(record_id)
+            raise
+
+        if is_transient(response.status_code):
+            self.release(record_id)
+        else:
+            headers = {
+                name: value
+                for name, value in response.headers.items()
+                if name not in CONTENT_HEADERS
+            }
+            await self.complete(
+                record_id,
+                self.build_record(
+                    fingerprint, response.status_code, response.body.decode(), headers
+                ),
+            )
+
+        return response
+
+    def build_record(
+        self,
+        fingerprint: str,
+        status_code: int,
+        content: str,
+        headers: dict[str, str] | None,
+    ) -> IdempotentResponse:
+        return IdempotentResponse(
+            fingerprint=fingerprint,
+            statusCode=status_code,
+            content=content,
+            headers=headers or {},
+            expiresAt=datetime.utcnow() + timedelta(seconds=self.config.ttl),
+        )
+
+    async def acquire(
+        self, record_id: str, fingerprint: str
+    ) -> IdempotentResponse | None:
+        """
+        Lock the key for the current request, returns the stored record instead
+        when the request has already been handled.
+        """
+        cached = await self.cache.get(record_id)
+
+        if cached:
+            return self.check(IdempotentResponse.parse_raw(cached), fingerprint)
+
+        now = datetime.utcnow()
+        lock_expires_at = now + timedelta(seconds=self.config.lock_timeout)
+
+        try:
+            await IdempotencyRecordDocument(
+                id=record_id, fingerprint=fingerprint, expiresAt=lock_expires_at
+            ).insert()
+            return None
+        except DuplicateKeyError:
+            pass
+
+        record = await IdempotencyRecordDocument.find_one(
+            {"_id": record_id}, projection_model=IdempotentResponse
+        )
+
+        if record and record.statusCode is not None:
+            await self.cache.set(record_id, record.json().encode(), self.config.ttl)
+            return self.check(record, fingerprint)
+
+        if record:
+            self.check(record, fingerprint)
+
+            # Take over requests abandoned without releasing their key.
+            if record.expiresAt <= now:
+                result = (
+                    await IdempotencyRecordDocument.get_motor_collection().update_one(
+                        {
+                            "_id": record_id,
+                            "statusCode": None,
+                            "expiresAt": record.expiresAt,
+                        },
+                        {"$set": {"expiresAt": lock_expires_at}},
+                    )
+                )
+
+                if result.modified_count:
+                    return None
+
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail="A request with the same idempotency key is in progress.",
+        )
+
+    @staticmethod
+    def check(record: IdempotentResponse, fingerprint: str) -> IdempotentResponse:
+        if record.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail="The idempotency key was used for a different request.",
+            )
+
+        return record
+
+    async def complete(self, record_id: str, record: IdempotentResponse):
+        # Cached first so the retries reaching this instance are replayed even if
+        # the record can't be stored.
+        await self.cache.set(record_id, record.json().encode(), self.config.ttl)
+
+        try:
+            # The request has been handled, so this runs past its deadline.
+            await run_past_deadline(self.store(record_id, record))
+        except PyMongoError:
+            # The response is still returned, the retries reaching other instances
+            # get a conflict until the lock expires.
+            logger.exception("Failed to store idempotency key %s.", record_id)
+            self.metrics.increment("idempotency_store_failed")
+
+    async def store(self, record_id: str, record: IdempotentResponse):
+        await IdempotencyRecordDocument.find_one({"_id": record_id}).update(
+            {"$set": record.dict()}
+        )
+
+    def release(self, record_id: str):
+        # Run in an empty context so an exceeded request deadline doesn't abort
+        # the deletion, the key is otherwise locked until `lock_timeout`.
+        task = asyncio.create_task(
+            self.delete_lock(record_id), context=contextvars.Context()
+        )
+        self.releasing.add(task)
+        task.add_done_callback(self.releasing.discard)
+
+    async def delete_lock(self, record_id: str):
+        try:
+            await IdempotencyRecordDocument.find(
+                {"_id": record_id, "statusCode": None}
+            ).delete()
+        except PyMongoError:
+            logger.exception("Failed to release idempotency key %s.", record_id)
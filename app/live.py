@@ -0,0 +1,339 @@
+import asyncio
+import contextvars
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+from uuid import UUID
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import LiveConfig
+from app.metrics import Metrics
+from app.models.documents import PostDocument
+from app.models.responses import GetPostsItem
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = {
+    "insert": "created",
+    "update": "updated",
+    "replace": "updated",
+    "delete": "deleted",
+}
+
+# Updates only changing these fields are not streamed, like the views added every
+# few seconds by `ViewCounter` which would otherwise produce an event per viewed
+# post, growing with the read traffic.
+UNSTREAMED_FIELDS = ["views", "revision_id"]
+
+# Names of the fields set by an update.
+UPDATED_FIELDS = {
+    "$map": {
+        "input": {"$objectToArray": "$updateDescription.updatedFields"},
+        "in": "$$this.k",
+    }
+}
+
+PIPELINE = [
+    {"$match": {"operationType": {"$in": list(EVENT_TYPES)}}},
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$ne": "update"}},
+                {"updateDescription.removedFields.0": {"$exists": True}},
+                {
+                    "$expr": {
+                        "$not": [{"$setIsSubset": [UPDATED_FIELDS, UNSTREAMED_FIELDS]}]
+                    }
+                },
+            ]
+        }
+    },
+]
+
+# Delay before reopening the change stream after an error.
+RETRY_DELAY = 1  # seconds
+
+# The events since the resume token are gone from the oplog
+# (ChangeStreamFatalError and ChangeStreamHistoryLost).
+HISTORY_LOST_CODES = {280, 286}
+
+
+@dataclass
+class LiveEvent:
+    event_id: str
+    type: str
+    data: str
+    creator_id: UUID | None = None
+    language: str | None = None
+
+    def encode(self) -> bytes:
+        return (
+            f"id: {self.event_id}\nevent: {self.type}\ndata: {self.data}\n\n".encode()
+        )
+
+
+@dataclass(eq=False)
+class Subscriber:
+    creator_id: UUID | None
+    language: str | None
+    queue: asyncio.Queue
+    closed: bool = field(default=False)
+
+    def matches(self, event: LiveEvent) -> bool:
+        # Deleted posts are not available anymore to be filtered.
+        if event.type == "deleted":
+            return True
+
+        return (not self.creator_id or self.creator_id == event.creator_id) and (
+            not self.language or self.language == event.language
+        )
+
+    def close(self):
+        self.closed = True
+
+        # When the queue is full the stream ends once it has been consumed.
+        if not self.queue.full():
+            self.queue.put_nowait(None)
+
+
+def parse_change(change: dict) -> LiveEvent | None:
+    event_type = EVENT_TYPES[change["operationType"]]
+    event_id = change["_id"]["_data"]
+
+    if event_type == "deleted":
+        data = json.dumps({"id": change["documentKey"]["_id"]})
+        return LiveEvent(event_id=event_id, type=event_type, data=data)
+
+    # The document might have been deleted before it could be looked up.
+    if not change.get("fullDocument"):
+        return None
+
+    post = GetPostsItem.from_mongo(PostDocument.parse_obj(change["fullDocument"]))
+
+    return LiveEvent(
+        event_id=event_id,
+        type=event_type,
+        data=post.json(),
+        creator_id=post.creatorId,
+        language=post.language,
+    )
+
+
+class LiveFeed:
+    """
+    Fan-out of the changes to the posts collection to the connected clients. A
+    single change stream is opened per instance when the first client connects.
+    The most recent events are kept so clients reconnecting with the id of the
+    last event they received don't miss any.
+    """
+
+    def __init__(self, config: LiveConfig, metrics: Metrics) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.subscribers: set[Subscriber] = set()
+        # Subscribers resuming from events no longer kept in memory are served
+        # by a dedicated change stream until they catch up with the shared one.
+        self.resuming: set[Subscriber] = set()
+        self.history: deque[LiveEvent] = deque(maxlen=config.history_size)
+        self.task: asyncio.Task | None = None
+
+        metrics.register_gauge("live_subscribers", self.count)
+
+    def count(self) -> int:
+        return len(self.subscribers) + len(self.resuming)
+
+    def is_full(self) -> bool:
+        return self.count() >= self.config.max_subscribers
+
+    def ensure_watching(self):
+        if self.task is None or self.task.done():
+            # Run in an empty context so the request deadline isn't inherited.
+            self.task = asyncio.create_task(self.watch(), context=contextvars.Context())
+
+    async def watch(self):
+        collection = PostDocument.get_motor_collection()
+        resume_token = None
+
+        while True:
+            try:
+                async with collection.watch(
+                    PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=resume_token,
+                ) as stream:
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        event = parse_change(change)
+
+                        if event:
+                            self.publish(event)
+            except PyMongoError as error:
+                code = error.code if isinstance(error, OperationFailure) else None
+
+                if resume_token is not None and code in HISTORY_LOST_CODES:
+                    # The stream restarts from now. The clients are disconnected
+                    # so they reconnect with their last event id and get a reset.
+                    logger.warning("Posts change stream history lost, restarting it.")
+                    self.metrics.increment("live_stream_resets")
+                    resume_token = None
+                    self.history.clear()
+
+                    for subscriber in list(self.subscribers):
+                        self.subscribers.discard(subscriber)
+                        subscriber.close()
+
+                    continue
+
+                # Reopened after the last event received, if any.
+                logger.exception("Posts change stream failed, reopening it.")
+                self.metrics.increment("live_stream_errors")
+                await asyncio.sleep(RETRY_DELAY)
+
+    def publish(self, event: LiveEvent):
+        self.history.append(event)
+
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(event):
+                continue
+
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumers are disconnected and have to resume from the
+                # last event they received.
+                self.metrics.increment("live_subscribers_dropped")
+                self.subscribers.discard(subscriber)
+                subscriber.close()
+
+    def replay(self, subscriber: Subscriber, last_event_id: str) -> bool:
+        """
+        Queue the events kept in memory since `last_event_id` and subscribe to the
+        next ones, returns `False` when they are not available anymore.
+        """
+        ids = [event.event_id for event in self.history]
+
+        if last_event_id not in ids:
+            return False
+
+        events = [
+            event
+            for event in list(self.history)[ids.index(last_event_id) + 1 :]
+            if subscriber.matches(event)
+        ]
+        queue = subscriber.queue
+
+        if queue.maxsize and len(events) > queue.maxsize - queue.qsize():
+            return False
+
+        for event in events:
+            queue.put_nowait(event)
+
+        # No await since the events were queued, so none can be missed.
+        self.subscribers.add(subscriber)
+        return True
+
+    async def listen(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        self.subscribers.add(subscriber)
+
+        try:
+            while not (subscriber.closed and subscriber.queue.empty()):
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), self.config.heartbeat
+                    )
+                except asyncio.TimeoutError:
+                    # Let proxies and clients know the connection is alive.
+                    yield b": heartbeat\n\n"
+                    continue
+
+                if event is None:
+                    break
+
+                yield event.encode()
+        finally:
+            self.subscribers.discard(subscriber)
+
+    async def resume(
+        self, subscriber: Subscriber, last_event_id: str
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the events since `last_event_id` from a dedicated change stream
+        until reaching one kept in memory, then hand the subscriber over to the
+        shared change stream.
+        """
+        collection = PostDocument.get_motor_collection()
+        lost = False
+        caught_up = False
+        self.resuming.add(subscriber)
+
+        try:
+            async with collection.watch(
+                PIPELINE,
+                full_document="updateLookup",
+                resume_after={"_data": last_event_id},
+                max_await_time_ms=int(self.config.heartbeat * 1000),
+            ) as stream:
+                while not subscriber.closed:
+                    # Also checked when idle, the shared stream might have
+                    # published the last event after the dedicated one.
+                    if self.replay(subscriber, last_event_id):
+                        caught_up = True
+                        break
+
+                    change = await stream.try_next()
+
+                    if change is None:
+                        yield b": heartbeat\n\n"
+                        continue
+
+                    last_event_id = change["_id"]["_data"]
+                    event = parse_change(change)
+
+                    if event and subscriber.matches(event):
+                        yield event.encode()
+        except OperationFailure:
+            # The events are gone from the oplog or the id is invalid.
+            lost = True
+        finally:
+            self.resuming.discard(subscriber)
+
+        if lost:
+            # The client has to reload the posts, new events are streamed as usual.
+            self.metrics.increment("live_resumes_lost")
+            yield b"event: reset\ndata: {}\n\n"
+
+        if lost or caught_up:
+            async for data in self.listen(subscriber):
+                yield data
+
+    async def stream(
+        self,
+        creator_id: UUID | None = None,
+        language: str | None = None,
+        last_event_id: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        subscriber = Subscriber(
+            creator_id, language, asyncio.Queue(self.config.buffer_size)
+        )
+
+        yield b": connected\n\n"
+        self.ensure_watching()
+
+        if not last_event_id or self.replay(subscriber, last_event_id):
+            events = self.listen(subscriber)
+        else:
+            events = self.resume(subscriber, last_event_id)
+
+        async for data in events:
+            yield data
+
+    async def close(self):
+        for subscriber in self.subscribers | self.resuming:
+            subscriber.close()
+
+        if self.task:
+            self.task.cancel()
+            await asyncio.wait([self.task])
@@ -0,0 +1,61 @@
+import asyncio
+from uuid import UUID
+
+from app.models.documents import UserDocument, UserPreview
+
+
+class UserLoader:
+    """
+    Loader batching the user lookups made during the same event loop iteration
+    into a single `$in` query. Results are cached, so it should only live for
+    the duration of a request, see `use_user_loader`.
+    """
+
+    def __init__(self) -> None:
+        self.futures: dict[UUID, asyncio.Future] = {}
+        self.pending: list[UUID] = []
+        self.tasks: set[asyncio.Task] = set()
+
+    def load(self, user_id: UUID) -> asyncio.Future:
+        future = self.futures.get(user_id)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.futures[user_id] = loop.create_future()
+            self.pending.append(user_id)
+
+            if len(self.pending) == 1:
+                loop.call_soon(self.dispatch)
+
+        return future
+
+    async def load_many(self, user_ids: list[UUID]) -> list[UserPreview | None]:
+        return await asyncio.gather(*map(self.load, user_ids))
+
+    def dispatch(self):
+        user_ids, self.pending = self.pending, []
+
+        # Keep a reference to the task so it isn't garbage collected.
+        task = asyncio.create_task(self.fetch(user_ids))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def fetch(self, user_ids: list[UUID]):
+        try:
+            # Deleted users are hidden like in the other user lookups.
+            users = await UserDocument.find(
+                {"_id": {"$in": user_ids}, "deletedAt": None},
+                projection_model=UserPreview,
+            ).to_list()
+        except Exception as exception:  # pylint: disable=broad-except
+            for user_id in user_ids:
+                self.futures.pop(user_id).set_exception(exception)
+            return
+
+        users_by_id = {user.id: user for user in users}
+
+        for user_id in user_ids:
+            future = self.futures[user_id]
+
+            if not future.done():
+                future.set_result(users_by_id.get(user_id))
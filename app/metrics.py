@@ -0,0 +1,22 @@
+from collections import Counter
+from typing import Callable
+
+
+class Metrics:
+    """In-process counters and gauges exposed by the `/metrics` endpoint."""
+
+    def __init__(self) -> None:
+        self.counters: Counter[str] = Counter()
+        self.gauges: dict[str, Callable[[], float]] = {}
+
+    def increment(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def register_gauge(self, name: str, gauge: Callable[[], float]):
+        self.gauges[name] = gauge
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return {
+            "counters": dict(self.counters),
+            "gauges": {name: gauge() for name, gauge in self.gauges.items()},
+        }
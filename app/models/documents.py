@@ -1,9 +1,10 @@
 from datetime import datetime
+from enum import Enum
 from typing import Optional
 from uuid import UUID, uuid4
 
 from beanie import Document, Link
-from pydantic import EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field
 from pymongo import IndexModel
 
 
@@ -13,19 +14,21 @@ class UserDocument(Document):
     passwordHash: bytes
     passwordUpdatedAt: Optional[datetime]
     name: Optional[str]
+    # Normalized name for prefix searches, see `normalize_name`.
+    nameLower: Optional[str]
     verified: Optional[bool]
 
-    verificationCode: Optional[UUID]
-    verificationCodeIat: Optional[datetime]
-
-    resetCode: Optional[UUID]
-    resetCodeIat: Optional[datetime]
-
     createdAt: datetime
     updatedAt: datetime
 
+    # Set when the account is deleted, the user is removed once its content has
+    # been deleted, see `UserDeletionDocument`.
+    deletedAt: Optional[datetime]
+
     class Settings:
         use_revision = True
+        # Allows `save_changes` to only $set the modified fields.
+        use_state_management = True
         validate_on_save = True
         name = "users"
         indexes = [
@@ -40,9 +43,48 @@ class UserDocument(Document):
                 unique=True,
                 partialFilterExpression={"name": {"$type": "string"}},
             ),
+            # Not unique, names only differing in case can coexist.
+            IndexModel("nameLower", name="name_lower", sparse=True),
         ]
 
 
+class LoggedUser(BaseModel):
+    """
+    Projection of `UserDocument` with just the fields needed to authenticate a
+    request, used to avoid fetching and validating the whole user every time.
+    """
+
+    id: UUID = Field(alias="_id")
+    verified: Optional[bool]
+    passwordUpdatedAt: Optional[datetime]
+    createdAt: datetime
+
+
+class UserProfile(BaseModel):
+    """Projection of `UserDocument` with the fields returned by the API."""
+
+    id: UUID = Field(alias="_id")
+    email: EmailStr
+    name: Optional[str]
+    verified: Optional[bool]
+    createdAt: datetime
+    updatedAt: datetime
+
+
+class LoggedUserProfile(UserProfile, LoggedUser):
+    """
+    Projection of `UserDocument` with the fields needed to authenticate a request
+    along with the fields returned by the API.
+    """
+
+
+class UserPreview(BaseModel):
+    """Projection of `UserDocument` with the public fields shown next to posts."""
+
+    id: UUID = Field(alias="_id")
+    name: Optional[str]
+
+
 class PostDocument(Document):
     id: str
     content: str
@@ -54,7 +96,155 @@ class PostDocument(Document):
 
     creator: Link[UserDocument]
 
+    # Number of the latest revision of the content, see `PostRevisionDocument`.
+    revision: int = 0
+
+    # Incremented in batches by `ViewCounter`.
+    views: int = 0
+
+    # Derived from the content, see `content_metadata`. Missing from the posts
+    # created before they were introduced until `app.tools.migrate` runs.
+    sizeBytes: Optional[int]
+    lineCount: Optional[int]
+    preview: Optional[str]
+
     class Settings:
         use_revision = True
+        use_state_management = True
         validate_on_save = True
         name = "posts"
+        indexes = [
+            IndexModel("creator.$id", name="creator"),
+            IndexModel([("views", -1), ("_id", 1)], name="most_viewed"),
+        ]
+
+
+class PostContent(BaseModel):
+    """Projection of `PostDocument` with just the content and its metadata."""
+
+    content: str
+    updatedAt: datetime
+
+
+class PostRevisionDocument(Document):
+    """
+    Revision of a post. Only every few revisions are stored as full snapshots of
+    the content, the rest are stored as a delta from the previous revision.
+    """
+
+    id: UUID = Field(default_factory=uuid4)
+    postId: str
+    number: int
+    name: Optional[str]
+    language: Optional[str]
+    content: Optional[str]
+    delta: Optional[list]
+
+    createdAt: datetime
+
+    class Settings:
+        name = "post_revisions"
+        indexes = [
+            IndexModel(
+                [("postId", 1), ("number", 1)],
+                name="unique_post_number",
+                unique=True,
+            ),
+        ]
+
+
+class UserCodeType(str, Enum):
+    VERIFICATION = "verification"
+    PASSWORD_RESET = "password_reset"
+
+
+class UserCodeDocument(Document):
+    """
+    One-time code sent to the user by email. The code itself is used as the
+    document id and expired codes are removed by Mongo using a TTL index.
+    """
+
+    id: UUID = Field(default_factory=uuid4)
+    type: UserCodeType
+    userId: UUID
+    expiresAt: datetime
+
+    class Settings:
+        name = "user_codes"
+        indexes = [
+            IndexModel("expiresAt", name="expiration", expireAfterSeconds=0),
+            IndexModel([("userId", 1), ("type", 1)], name="user_type"),
+        ]
+
+
+class IdempotencyRecordDocument(Document):
+    """
+    Response to a request sent with an `Idempotency-Key` header, replayed when
+    the request is retried. The status is missing while the request is being
+    handled. Expired records are removed by Mongo using a TTL index.
+    """
+
+    id: str
+    fingerprint: str
+    statusCode: Optional[int]
+    content: Optional[str]
+    headers: dict[str, str] = {}
+    expiresAt: datetime
+
+    class Settings:
+        name = "idempotency_records"
+        indexes = [
+            IndexModel("expiresAt", name="expiration", expireAfterSeconds=0),
+        ]
+
+
+class UserDeletionStatus(str, Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class UserDeletionDocument(Document):
+    """
+    Deletion of the content of a deleted user, run in the background in batches
+    by `UserDeleter`. The document id is the id of the deleted user. Jobs are
+    leased by the instance running them until `lockedUntil`, so jobs left behind
+    by a crashed instance are resumed by another one.
+    """
+
+    id: UUID
+    status: UserDeletionStatus = UserDeletionStatus.IN_PROGRESS
+    deletedPosts: int = 0
+    deletedRevisions: int = 0
+    lockedUntil: datetime
+    createdAt: datetime
+    updatedAt: datetime
+    completedAt: Optional[datetime]
+    # Handed out when the deletion is requested, since the user can't log in to
+    # check on its progress anymore. Missing from the jobs created before it.
+    token: Optional[UUID]
+
+    class Settings:
+        name = "user_deletions"
+        indexes = [
+            IndexModel([("status", 1), ("lockedUntil", 1)], name="status_lease"),
+            # Completed jobs are kept for a while to report their outcome.
+            IndexModel("completedAt", name="expiration", expireAfterSeconds=604_800),
+        ]
+
+
+class IdempotentResponse(BaseModel):
+    fingerprint: str
+    statusCode: Optional[int]
+    content: Optional[str]
+    headers: dict[str, str] = {}
+    expiresAt: datetime
+
+
+DOCUMENT_MODELS = [
+    UserDocument,
+    PostDocument,
+    PostRevisionDocument,
+    UserCodeDocument,
+    IdempotencyRecordDocument,
+    UserDeletionDocument,
+]
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, EmailStr, NonNegativeInt, conint, constr, root_validator
@@ -12,6 +12,9 @@ GET_POSTS_PAGE_SIZE_LIMIT = 32
 USER_NAME_MAX_LEN = 32
 USER_PASSWORD_MIN_LEN = 4
 USER_PASSWORD_MAX_LEN = 256
+USER_SEARCH_LIMIT = 20
+# Enough to resolve the creators of a full page of posts at once.
+USER_LOOKUP_LIMIT = GET_POSTS_PAGE_SIZE_LIMIT
 
 
 class GetPostsParams(BaseModel):
@@ -19,6 +22,8 @@ class GetPostsParams(BaseModel):
     limit: Optional[conint(ge=0, le=GET_POSTS_PAGE_SIZE_LIMIT)] = 0
     creatorId: Optional[UUID]
     language: Optional[constr(max_length=POST_LANGUAGE_MAX_LEN)]
+    expand: Optional[Literal["creator"]]
+    sort: Literal["recent", "views"] = "recent"
 
 
 class CreatePostRequest(BaseModel):
@@ -38,6 +43,11 @@ class UpdateUserRequest(BaseModel):
     name: Optional[constr(max_length=USER_NAME_MAX_LEN)]
 
 
+class SearchUsersParams(BaseModel):
+    prefix: constr(min_length=1, max_length=USER_NAME_MAX_LEN)
+    limit: conint(ge=1, le=USER_SEARCH_LIMIT) = 10
+
+
 class LoginUserRequest(BaseModel):
     email: Optional[EmailStr]
     name: Optional[str]
@@ -8,7 +8,16 @@ from pydantic import BaseModel
 from pydantic.generics import GenericModel
 from typing_extensions import Self
 
-from app.models.documents import PostDocument, UserDocument
+from app.fields import partial_model
+from app.models.documents import (
+    PostDocument,
+    PostRevisionDocument,
+    UserDeletionDocument,
+    UserDeletionStatus,
+    UserDocument,
+    UserPreview,
+    UserProfile,
+)
 
 T = TypeVar("T")
 
@@ -27,19 +36,44 @@ class PaginatedResponse(GenericModel, Generic[T]):
         return f"Paginated{params[0].__name__}"
 
 
+class CreatorResponse(BaseModel):
+    id: UUID
+    name: Optional[str]
+
+    @staticmethod
+    def from_mongo(user: UserPreview | None) -> Self | None:
+        return CreatorResponse(**user.dict()) if user else None
+
+
 class GetPostsItem(BaseModel):
     id: str
+    creatorId: UUID
     name: Optional[str]
     language: Optional[str]
+    views: int
+    sizeBytes: Optional[int]
+    lineCount: Optional[int]
+    preview: Optional[str]
     createdAt: datetime
     updatedAt: datetime
 
     @staticmethod
     def from_mongo(post: PostDocument) -> Self:
-        return GetPostsItem(**post.dict())
+        return GetPostsItem(
+            **post.dict(exclude={"creator"}), creatorId=post.creator.ref.id
+        )
+
+
+class ExpandedGetPostsItem(GetPostsItem):
+    # Null when the creator was deleted.
+    creator: Optional[CreatorResponse]
 
 
 GetPostsResponse = PaginatedResponse[GetPostsItem]
+ExpandedGetPostsResponse = PaginatedResponse[ExpandedGetPostsItem]
+
+# Responses trimmed by the `fields` parameter.
+PartialGetPostsResponse = PaginatedResponse[partial_model(ExpandedGetPostsItem)]
 
 
 class PostResponse(BaseModel):
@@ -48,12 +82,46 @@ class PostResponse(BaseModel):
     name: Optional[str]
     language: Optional[str]
     content: str
+    revision: int
+    views: int
+    sizeBytes: Optional[int]
+    lineCount: Optional[int]
     createdAt: datetime
     updatedAt: datetime
 
     @staticmethod
     def from_mongo(post: PostDocument) -> Self:
-        return PostResponse(**post.dict(), creatorId=post.creator.ref.id)
+        return PostResponse(
+            **post.dict(exclude={"creator"}), creatorId=post.creator.ref.id
+        )
+
+
+class ExpandedPostResponse(PostResponse):
+    # Null when the creator was deleted.
+    creator: Optional[CreatorResponse]
+
+
+PartialPostResponse = partial_model(ExpandedPostResponse)
+
+
+class PostRevisionItem(BaseModel):
+    number: int
+    name: Optional[str]
+    language: Optional[str]
+    createdAt: datetime
+
+
+class PostRevisionResponse(BaseModel):
+    postId: str
+    number: int
+    name: Optional[str]
+    language: Optional[str]
+    content: str
+    createdAt: datetime
+
+    @staticmethod
+    def from_mongo(revision: PostRevisionDocument) -> Self:
+        return PostRevisionResponse(**revision.dict())
 
 
 class UserResponse(BaseModel):
@@ -65,5 +133,45 @@ class UserResponse(BaseModel):
     updatedAt: datetime
 
     @staticmethod
-    def from_mongo(user: UserDocument) -> Self:
+    def from_mongo(user: UserDocument | UserProfile) -> Self:
         return UserResponse(**user.dict())
+
+
+PartialUserResponse = partial_model(UserResponse)
+
+
+class LookupUsersResponse(BaseModel):
+    data: list[UserResponse]
+    # Requested ids not matching any user.
+    missing: list[UUID]
+
+
+class UserSearchItem(BaseModel):
+    id: UUID
+    name: str
+
+    @staticmethod
+    def from_mongo(user: UserPreview) -> Self:
+        return UserSearchItem(**user.dict())
+
+
+class UserDeletionResponse(BaseModel):
+    userId: UUID
+    status: UserDeletionStatus
+    deletedPosts: int
+    deletedRevisions: int
+    createdAt: datetime
+    completedAt: Optional[datetime]
+
+    @staticmethod
+    def from_mongo(deletion: UserDeletionDocument) -> Self:
+        return UserDeletionResponse(**deletion.dict(), userId=deletion.id)
+
+
+class ScheduledUserDeletionResponse(UserDeletionResponse):
+    # Sent in the `Deletion-Token` header to check on the progress.
+    token: UUID
+
+    @staticmethod
+    def from_mongo(deletion: UserDeletionDocument) -> Self:
+        return ScheduledUserDeletionResponse(**deletion.dict(), userId=deletion.id)
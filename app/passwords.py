@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+# bcrypt is only imported when first needed to keep the application startup fast.
+# Hashing runs in the thread pool so it doesn't block the event loop, bcrypt
+# releases the GIL while hashing.
+# pylint: disable=import-outside-toplevel
+
+
+async def run_to_completion(function: Callable, *args) -> Any:
+    """
+    Run `function` in the thread pool. Threads can't be interrupted, so when
+    cancelled this waits for the thread to finish before propagating the
+    cancellation, which keeps the admission slot held while the hash is computed.
+    """
+    task = asyncio.ensure_future(run_in_threadpool(function, *args))
+
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        while not task.done():
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                pass
+
+        raise
+
+
+async def hash_password(password: str, rounds: int) -> bytes:
+    import bcrypt
+
+    salt = bcrypt.gensalt(rounds)
+    return await run_to_completion(bcrypt.hashpw, password.encode(), salt)
+
+
+async def check_password(password: str, password_hash: bytes) -> bool:
+    import bcrypt
+
+    return await run_to_completion(bcrypt.checkpw, password.encode(), password_hash)
+
+
+def get_rounds(password_hash: bytes) -> int:
+    """Extract the work factor from a hash in the `$2b$<rounds>$<salt+hash>` format."""
+    return int(password_hash.split(b"$")[2])
+
+
+def needs_rehash(password_hash: bytes, rounds: int) -> bool:
+    return get_rounds(password_hash) != rounds
@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from app.access_log import AccessLog
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+@lru_cache()
+def use_access_log():
+    return AccessLog(use_config().access_log, use_metrics())
@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from app.admission import AdmissionController
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+@lru_cache()
+def use_admission_controller():
+    return AdmissionController(use_config().password, use_metrics())
@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from app.idempotency import IdempotencyStore
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+@lru_cache()
+def use_idempotency_store():
+    return IdempotencyStore(use_config().idempotency, use_metrics())
@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from app.live import LiveFeed
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+@lru_cache()
+def use_live_feed():
+    return LiveFeed(use_config().live, use_metrics())
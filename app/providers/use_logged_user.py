@@ -1,15 +1,27 @@
 from datetime import timedelta
 from http import HTTPStatus
+from typing import TypeVar
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 
 from app.access_token import AccessToken
-from app.models.documents import UserDocument
+from app.models.documents import LoggedUser, UserDocument
 from app.providers.use_access_token import use_access_token
 
+Projection = TypeVar("Projection", bound=LoggedUser)
 
-async def use_logged_user(jwt: AccessToken = Depends(use_access_token)):
-    user = await UserDocument.get(jwt.sub)
+
+async def authenticate(
+    request: Request, jwt: AccessToken, projection: type[Projection]
+) -> Projection:
+    """
+    Look up the user of the token with a projection which can hold more fields
+    than needed for the authentication, so they are fetched with the same query.
+    """
+    # Deleted users are rejected right away, before their content is deleted.
+    user = await UserDocument.find_one(
+        {"_id": jwt.sub, "deletedAt": None}, projection_model=projection
+    )
 
     if not user:
         raise HTTPException(
@@ -27,4 +39,17 @@ async def use_logged_user(jwt: AccessToken = Depends(use_access_token)):
             detail="The provided token has been invalidated.",
         )
 
+    # Logged along with the request.
+    request.state.user_id = str(user.id)
+
     return user
+
+
+async def use_logged_user(
+    request: Request, jwt: AccessToken = Depends(use_access_token)
+) -> LoggedUser:
+    """
+    NOTE: Only a projection of the user is returned, use `use_logged_user_document`
+    for handlers that need the whole document.
+    """
+    return await authenticate(request, jwt, LoggedUser)
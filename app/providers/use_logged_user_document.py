@@ -0,0 +1,19 @@
+from http import HTTPStatus
+
+from fastapi import Depends, HTTPException
+
+from app.models.documents import LoggedUser, UserDocument
+from app.providers.use_logged_user import use_logged_user
+
+
+async def use_logged_user_document(user: LoggedUser = Depends(use_logged_user)):
+    document = await UserDocument.get(user.id)
+
+    # The user could have been deleted since it was authenticated.
+    if not document:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail="The provided token does not match any existing user.",
+        )
+
+    return document
@@ -0,0 +1,13 @@
+from fastapi import Depends, Request
+
+from app.access_token import AccessToken
+from app.models.documents import LoggedUserProfile
+from app.providers.use_access_token import use_access_token
+from app.providers.use_logged_user import authenticate
+
+
+async def use_logged_user_profile(
+    request: Request, jwt: AccessToken = Depends(use_access_token)
+) -> LoggedUserProfile:
+    """Authenticate the request and fetch the profile of the user in one query."""
+    return await authenticate(request, jwt, LoggedUserProfile)
@@ -0,0 +1,8 @@
+from functools import lru_cache
+
+from app.metrics import Metrics
+
+
+@lru_cache()
+def use_metrics():
+    return Metrics()
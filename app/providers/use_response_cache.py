@@ -0,0 +1,17 @@
+from functools import lru_cache
+
+from app.cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+@lru_cache()
+def use_response_cache():
+    config = use_config().cache
+
+    if config.backend == "redis":
+        backend = RedisCacheBackend(config.url or "redis://localhost", config.pool_size)
+    else:
+        backend = MemoryCacheBackend(config.max_entries)
+
+    return ResponseCache(backend, use_metrics())
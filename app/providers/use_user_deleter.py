@@ -0,0 +1,11 @@
+from functools import lru_cache
+
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+from app.providers.use_response_cache import use_response_cache
+from app.user_deletion import UserDeleter
+
+
+@lru_cache()
+def use_user_deleter():
+    return UserDeleter(use_config().user_deletion, use_metrics(), use_response_cache())
@@ -0,0 +1,6 @@
+from app.loaders import UserLoader
+
+
+def use_user_loader():
+    # Dependencies are cached per request, so is the loader.
+    return UserLoader()
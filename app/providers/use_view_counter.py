@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+from app.view_counter import ViewCounter
+
+
+@lru_cache()
+def use_view_counter():
+    return ViewCounter(use_config().views, use_metrics())
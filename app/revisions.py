@@ -0,0 +1,149 @@
+from pymongo.errors import DuplicateKeyError
+
+from app.models.documents import PostDocument, PostRevisionDocument
+from app.util.delta import Delta, delta_size, diff, patch
+
+
+def encode_content(
+    number: int, content: str, previous_content: str | None, snapshot_interval: int
+) -> tuple[str | None, Delta | None]:
+    """Return either the full content or a delta to store for a revision."""
+    if previous_content is not None and number % snapshot_interval:
+        delta = diff(previous_content, content)
+
+        # Deltas of heavily edited (or single line) contents can end up being
+        # larger than the content itself.
+        if delta_size(delta) < len(content.encode()):
+            return None, delta
+
+    return content, None
+
+
+class MissingRevisionError(Exception):
+    """A revision needed to rebuild the content of a later one is missing."""
+
+
+def decode_content(revisions: list[tuple[int, str | None, Delta | None]]) -> str | None:
+    """
+    Rebuild the content of the last of a list of `(number, content, delta)`
+    revisions sorted by number, starting from the last snapshot. Returns `None`
+    when there is no snapshot, and raises `MissingRevisionError` when there is a
+    gap after it since the deltas would be applied to the wrong content.
+    """
+    start = max(
+        (
+            index
+            for index, (_, content, _) in enumerate(revisions)
+            if content is not None
+        ),
+        default=None,
+    )
+
+    if start is None:
+        return None
+
+    number, content, _ = revisions[start]
+
+    for next_number, _, delta in revisions[start + 1 :]:
+        if next_number != number + 1:
+            raise MissingRevisionError(f"Revision {number + 1} is missing.")
+
+        number = next_number
+        content = patch(content, delta)
+
+    return content
+
+
+def build_revision(
+    post: PostDocument, previous_content: str | None, snapshot_interval: int
+) -> PostRevisionDocument:
+    content, delta = encode_content(
+        post.revision, post.content, previous_content, snapshot_interval
+    )
+
+    return PostRevisionDocument(
+        postId=post.id,
+        number=post.revision,
+        name=post.name,
+        language=post.language,
+        content=content,
+        delta=delta,
+        createdAt=post.updatedAt,
+    )
+
+
+async def save_revision(
+    post: PostDocument, previous: PostDocument | None, snapshot_interval: int
+):
+    """
+    Store the current revision of a post given its previous version, which is
+    `None` for newly created posts.
+    """
+    if previous and previous.revision == 0:
+        # Posts created before revisions were introduced don't have a first
+        # revision yet, it might also be already stored.
+        try:
+            await build_revision(previous, None, snapshot_interval).insert()
+        except DuplicateKeyError:
+            pass
+
+    previous_content = previous.content if previous else None
+    await build_revision(post, previous_content, snapshot_interval).insert()
+
+
+async def find_revisions(post_id: str, start: int, stop: int):
+    return (
+        await PostRevisionDocument.find(
+            {"postId": post_id, "number": {"$gte": start, "$lte": stop}}
+        )
+        .sort("+number")
+        .to_list()
+    )
+
+
+async def load_revision(
+    post_id: str, number: int, snapshot_interval: int
+) -> PostRevisionDocument | None:
+    """
+    Rebuild a revision by applying the deltas stored since the last snapshot,
+    which is at most `snapshot_interval` revisions behind. Raises
+    `MissingRevisionError` when one of the revisions in between is missing.
+    """
+    revisions = await find_revisions(
+        post_id, number - number % snapshot_interval, number
+    )
+
+    if not revisions or revisions[-1].number != number:
+        return None
+
+    content = decode_content(
+        [(rev.number, rev.content, rev.delta) for rev in revisions]
+    )
+
+    if content is None:
+        # The snapshot interval was increased since the revision was stored.
+        snapshot = (
+            await PostRevisionDocument.find(
+                {
+                    "postId": post_id,
+                    "number": {"$lt": revisions[0].number},
+                    "content": {"$ne": None},
+                }
+            )
+            .sort("-number")
+            .first_or_none()
+        )
+
+        if not snapshot:
+            return None
+
+        revisions = await find_revisions(post_id, snapshot.number, number)
+        content = decode_content(
+            [(rev.number, rev.content, rev.delta) for rev in revisions]
+        )
+
+    revision = revisions[-1]
+    revision.content = content
+    revision.delta = None
+
+    return revision
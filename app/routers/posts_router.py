@@ -1,36 +1,252 @@
 import asyncio
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
 from http import HTTPStatus
-
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import NonNegativeInt
+from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
 
-from app.models.documents import PostDocument, UserDocument
+from app.cache import ResponseCache, post_cache_key
+from app.config import Config
+from app.deadlines import DeadlineRoute, run_past_deadline
+from app.fields import (
+    Fields,
+    construct_partial,
+    fields_query,
+    projection_model,
+    trim_json,
+)
+from app.idempotency import IdempotencyStore, request_fingerprint
+from app.live import LiveFeed
+from app.loaders import UserLoader
+from app.models.documents import (
+    LoggedUser,
+    PostContent,
+    PostDocument,
+    PostRevisionDocument,
+)
 from app.models.requests import CreatePostRequest, GetPostsParams
 from app.models.responses import (
+    CreatorResponse,
+    ExpandedGetPostsItem,
+    ExpandedGetPostsResponse,
+    ExpandedPostResponse,
     GetPostsItem,
     GetPostsResponse,
     PaginatedResponse,
+    PartialGetPostsResponse,
+    PartialPostResponse,
     PostResponse,
+    PostRevisionItem,
+    PostRevisionResponse,
 )
+from app.providers.use_config import use_config
+from app.providers.use_idempotency_store import use_idempotency_store
+from app.providers.use_live_feed import use_live_feed
 from app.providers.use_logged_user import use_logged_user
+from app.providers.use_response_cache import use_response_cache
+from app.providers.use_user_loader import use_user_loader
+from app.providers.use_view_counter import use_view_counter
+from app.revisions import MissingRevisionError, load_revision, save_revision
+from app.user_deletion import discard_orphan_post
+from app.util.content import content_metadata
+from app.util.ranges import RangeNotSatisfiable, parse_range
 from app.util.shortid import generate_shortid
+from app.view_counter import ViewCounter
+
+posts_router = APIRouter(route_class=DeadlineRoute)
+
+LISTED_FIELDS = list(GetPostsItem.__fields__)
+
+
+# Declared before `get_post` so "live" isn't taken for a post id.
+@posts_router.get(
+    "/live",
+    response_class=StreamingResponse,
+    responses={HTTPStatus.OK.value: {"content": {"text/event-stream": {}}}},
+)
+async def get_live_posts(
+    creator_id: UUID | None = Query(default=None, alias="creatorId"),
+    language: str | None = None,
+    last_event_id: str | None = Header(default=None),
+    live_feed: LiveFeed = Depends(use_live_feed),
+):
+    """
+    Stream the created, updated and deleted posts as server-sent events. Clients
+    reconnecting with the `Last-Event-ID` header receive the events they missed.
+    """
+    if live_feed.is_full():
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail="Too many clients connected, please retry later.",
+        )
+
+    return StreamingResponse(
+        live_feed.stream(creator_id, language, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@posts_router.get(
+    "/{post_id}",
+    response_model=PostResponse | ExpandedPostResponse | PartialPostResponse,
+)
+async def get_post(
+    post_id: str,
+    expand: Literal["creator"] | None = None,
+    fields: Fields = Depends(fields_query(PostResponse)),
+    config: Config = Depends(use_config),
+    cache: ResponseCache = Depends(use_response_cache),
+    user_loader: UserLoader = Depends(use_user_loader),
+    view_counter: ViewCounter = Depends(use_view_counter),
+):
+    async def load():
+        post = await PostDocument.get(post_id)
+        return PostResponse.from_mongo(post).json().encode() if post else None
 
-posts_router = APIRouter()
+    content = await cache.get_or_load(
+        post_cache_key(post_id), load, config.cache.post_ttl
+    )
 
+    if not content:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
 
-@posts_router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: str):
-    post = await PostDocument.get(post_id)
+    # The views returned lag behind by up to the cache TTL plus the flush interval.
+    view_counter.record(post_id)
+
+    if expand == "creator":
+        post = ExpandedPostResponse.parse_raw(content)
+        creator = await user_loader.load(post.creatorId)
+        post.creator = CreatorResponse.from_mongo(creator)
+        include = {*fields, "creator"} if fields else None
+
+        return JSONResponse(jsonable_encoder(post, include=include))
+
+    # The whole post is cached, so the requested fields are picked from it.
+    if fields:
+        return JSONResponse(trim_json(content, fields))
+
+    return Response(content=content, media_type="application/json")
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # `If-None-Match` uses the weak comparison, ignoring the "W/" prefix.
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+@posts_router.get("/{post_id}/raw", response_class=PlainTextResponse)
+async def get_post_raw(
+    post_id: str,
+    byte_range: str | None = Header(default=None, alias="Range"),
+    if_range: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+    config: Config = Depends(use_config),
+):
+    post = await PostDocument.find_one({"_id": post_id}, projection_model=PostContent)
 
     if not post:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
 
-    return PostResponse.from_mongo(post)
+    content = post.content.encode()
+    size = len(content)
+    etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+    last_modified = format_datetime(
+        post.updatedAt.replace(tzinfo=timezone.utc), usegmt=True
+    )
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={config.posts.raw_max_age}",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    # The range is ignored when the content changed since the client got the
+    # validator passed in `If-Range`, and the whole content is served instead.
+    if byte_range and (not if_range or if_range in (etag, last_modified)):
+        try:
+            positions = parse_range(byte_range, size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+
+        if positions:
+            start, end = positions
+
+            return Response(
+                content=content[start : end + 1],
+                status_code=HTTPStatus.PARTIAL_CONTENT,
+                media_type="text/plain",
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+            )
+
+    return Response(content=content, media_type="text/plain", headers=headers)
+
+
+@posts_router.get("/{post_id}/revisions", response_model=list[PostRevisionItem])
+async def get_post_revisions(post_id: str):
+    revisions = (
+        await PostRevisionDocument.find(
+            {"postId": post_id}, projection_model=PostRevisionItem
+        )
+        .sort("-number")
+        .to_list()
+    )
+
+    if not revisions and not await PostDocument.find({"_id": post_id}).count():
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
+
+    return revisions
+
 
+@posts_router.get("/{post_id}/revisions/{number}", response_model=PostRevisionResponse)
+async def get_post_revision(
+    post_id: str,
+    number: NonNegativeInt,
+    config: Config = Depends(use_config),
+):
+    try:
+        revision = await load_revision(
+            post_id, number, config.posts.revision_snapshot_interval
+        )
+    except MissingRevisionError as exception:
+        raise HTTPException(
+            status_code=HTTPStatus.GONE,
+            detail="Revision can't be rebuilt, a previous revision is missing.",
+        ) from exception
+
+    if not revision:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="Revision not found."
+        )
+
+    return PostRevisionResponse.from_mongo(revision)
 
-@posts_router.get("/", response_model=GetPostsResponse)
-async def get_posts(query: GetPostsParams = Depends()):
+
+@posts_router.get(
+    "/",
+    response_model=GetPostsResponse
+    | ExpandedGetPostsResponse
+    | PartialGetPostsResponse,
+)
+async def get_posts(
+    query: GetPostsParams = Depends(),
+    fields: Fields = Depends(fields_query(GetPostsItem)),
+    user_loader: UserLoader = Depends(use_user_loader),
+):
     find = {}
 
     if query.creatorId:
@@ -40,78 +256,172 @@ async def get_posts(query: GetPostsParams = Depends()):
 
     # We want the posts to always be sorted in a deterministic order to
     # preserve pagination.
-    sort = ["-updatedAt", "-createdAt", "+id"]
+    if query.sort == "views":
+        sort = ["-views", "+id"]
+    else:
+        sort = ["-updatedAt", "-createdAt", "+id"]
+
+    # Posts are listed without their content, the requested fields or all the
+    # fields of the items are fetched with a projection.
+    fetched = fields or LISTED_FIELDS
+
+    if query.expand == "creator" and "creatorId" not in fetched:
+        # The creator id is needed to expand the creator.
+        fetched = fetched + ["creatorId"]
 
     data, total_count = await asyncio.gather(
-        PostDocument.find(find)
+        PostDocument.find(
+            find, projection_model=projection_model(PostDocument, tuple(fetched))
+        )
         .sort(sort)
         .skip(query.skip)
         .limit(query.limit)
         .to_list(),
         PostDocument.find(find).count(),
     )
+    model = ExpandedGetPostsItem if query.expand == "creator" else GetPostsItem
+    posts = [construct_partial(model, post) for post in data]
+
+    if query.expand == "creator":
+        # All the creators of the page are fetched with a single query.
+        creators = await user_loader.load_many([post.creatorId for post in posts])
 
-    posts = list(map(GetPostsItem.from_mongo, data))
+        for post, creator in zip(posts, creators):
+            post.creator = CreatorResponse.from_mongo(creator)
     has_more = total_count - query.skip - query.limit > 0
 
-    return PaginatedResponse(data=posts, hasMore=has_more, totalCount=total_count)
+    if fields:
+        include = {*fields, "creator"} if query.expand == "creator" else set(fields)
+        data = [jsonable_encoder(post, include=include) for post in posts]
+
+        return JSONResponse(
+            {"data": data, "hasMore": has_more, "totalCount": total_count}
+        )
+
+    response = PaginatedResponse(data=posts, hasMore=has_more, totalCount=total_count)
+
+    # Validated against the response models, the creators would be dropped.
+    if query.expand == "creator":
+        return JSONResponse(jsonable_encoder(response))
+
+    return response
 
 
 @posts_router.post("/", response_model=PostResponse, status_code=HTTPStatus.CREATED)
 async def create_post(
     body: CreatePostRequest,
-    user: UserDocument = Depends(use_logged_user),
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    user: LoggedUser = Depends(use_logged_user),
+    config: Config = Depends(use_config),
+    idempotency: IdempotencyStore = Depends(use_idempotency_store),
 ):
     if not user.verified:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED, detail="User not verified."
         )
 
-    # We use short ids to make it easy for users to share posts by id, so we
-    # have to take into account the (unlikely) possibility of having two ids clashing.
-    while True:
-        post_id = generate_shortid()
-        created_at = datetime.utcnow()
-
-        post = PostDocument(
-            id=post_id,
-            creator=user.id,
-            createdAt=created_at,
-            updatedAt=created_at,
-            **body.dict()
-        )
+    async def create() -> Response:
+        # We use short ids to make it easy for users to share posts by id, so we
+        # have to take into account the (unlikely) possibility of having two ids
+        # clashing.
+        while True:
+            post_id = generate_shortid()
+            created_at = datetime.utcnow()
+
+            post = PostDocument(
+                id=post_id,
+                creator=user.id,
+                createdAt=created_at,
+                updatedAt=created_at,
+                **body.dict(),
+                **content_metadata(body.content, config.posts.preview_length),
+            )
+
+            try:
+                await post.insert()
+            except DuplicateKeyError:
+                continue
+
+            # Not bound to the request so a cancelled or timed out request doesn't
+            # leave the post without its first revision, which the later ones are
+            # built from.
+            await run_past_deadline(
+                save_revision(post, None, config.posts.revision_snapshot_interval)
+            )
+
+            # Checked once the post is written, so either this or the deletion of
+            # the posts of the user sees it.
+            if await run_past_deadline(discard_orphan_post(post_id, user.id)):
+                raise HTTPException(
+                    status_code=HTTPStatus.UNAUTHORIZED,
+                    detail="The provided token does not match any existing user.",
+                )
+
+            return Response(
+                content=PostResponse.from_mongo(post).json(),
+                status_code=HTTPStatus.CREATED,
+                media_type="application/json",
+            )
+
+    return await idempotency.run(
+        f"create_post:{user.id}", idempotency_key, request_fingerprint(body), create
+    )
 
-        try:
-            await post.insert()
-        except DuplicateKeyError:
-            continue
 
-        return PostResponse.from_mongo(post)
+async def raise_post_not_owned(post_id: str):
+    """
+    Called when a write filtered on both the post id and creator matched nothing,
+    to tell apart a missing post from one owned by somebody else.
+    """
+    if not await PostDocument.find({"_id": post_id}).count():
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
+
+    raise HTTPException(
+        status_code=HTTPStatus.UNAUTHORIZED,
+        detail="Current user is not the owner of the post.",
+    )
 
 
 @posts_router.put("/{post_id}", response_model=PostResponse)
 async def update_post(
     post_id: str,
     body: CreatePostRequest,
-    user: UserDocument = Depends(use_logged_user),
+    user: LoggedUser = Depends(use_logged_user),
+    config: Config = Depends(use_config),
+    cache: ResponseCache = Depends(use_response_cache),
 ):
-    post = await PostDocument.get(post_id)
+    changes = {
+        **body.dict(),
+        **content_metadata(body.content, config.posts.preview_length),
+        "updatedAt": datetime.utcnow(),
+    }
+
+    # The ownership check and the update are performed atomically in a single
+    # round-trip by filtering on the creator. The previous version is returned
+    # to store the new revision as a delta from it.
+    document = await PostDocument.get_motor_collection().find_one_and_update(
+        {"_id": post_id, "creator.$id": user.id},
+        {"$set": {**changes, "revision_id": uuid4()}, "$inc": {"revision": 1}},
+        return_document=ReturnDocument.BEFORE,
+    )
 
-    if not post:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
+    if not document:
+        await raise_post_not_owned(post_id)
 
-    if post.creator.ref.id != user.id:
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED,
-            detail="Current user is not the owner of the post.",
-        )
-
-    post.content = body.content
-    post.name = body.name
-    post.language = body.language
-    post.updatedAt = datetime.utcnow()
+    previous = PostDocument.parse_obj(document)
+    post = PostDocument.parse_obj(
+        {**document, **changes, "revision": previous.revision + 1}
+    )
 
-    await post.save()
+    # The revision is stored after the post was updated, so it isn't bound to the
+    # request: a cancelled (e.g. on a client disconnect) or timed out request
+    # would otherwise leave a gap in the revisions, breaking the next deltas.
+    await asyncio.gather(
+        run_past_deadline(
+            save_revision(post, previous, config.posts.revision_snapshot_interval)
+        ),
+        run_past_deadline(cache.invalidate(post_cache_key(post_id))),
+    )
 
     return PostResponse.from_mongo(post)
 
@@ -119,17 +429,15 @@ async def update_post(
 @posts_router.delete("/{post_id}", status_code=HTTPStatus.NO_CONTENT)
 async def delete_post(
     post_id: str,
-    user: UserDocument = Depends(use_logged_user),
+    user: LoggedUser = Depends(use_logged_user),
+    cache: ResponseCache = Depends(use_response_cache),
 ):
-    post = await PostDocument.get(post_id)
+    result = await PostDocument.find_one(
+        {"_id": post_id, "creator.$id": user.id}
+    ).delete()
 
-    if not post:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Post not found.")
-
-    if post.creator.ref.id != user.id:
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED,
-            detail="Current user is not the owner of the post.",
-        )
+    if not result.deleted_count:
+        await raise_post_not_owned(post_id)
 
-    await post.delete()
+    await PostRevisionDocument.find({"postId": post_id}).delete()
+    await cache.invalidate(post_cache_key(post_id))
@@ -4,117 +4,338 @@ from http import HTTPStatus
 from urllib.parse import urljoin
 from uuid import UUID, uuid4
 
-import bcrypt
-from fastapi import APIRouter, Depends, HTTPException, Response
+from beanie.odm.utils.dump import get_dict
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pymongo.errors import DuplicateKeyError
 
 from app.access_token import AccessToken
+from app.admission import AdmissionController
+from app.cache import ResponseCache, user_cache_key
 from app.config import Config
+from app.deadlines import DeadlineRoute
 from app.email_service import EmailService
-from app.models.documents import UserDocument
+from app.fields import Fields, fields_query, trim_json
+from app.idempotency import IdempotencyStore, request_fingerprint
+from app.models.documents import (
+    LoggedUser,
+    LoggedUserProfile,
+    UserCodeDocument,
+    UserCodeType,
+    UserDeletionDocument,
+    UserDocument,
+    UserPreview,
+    UserProfile,
+)
 from app.models.requests import (
+    USER_LOOKUP_LIMIT,
     CreateUserRequest,
     LoginUserRequest,
     ResetPasswordRequest,
+    SearchUsersParams,
     UpdateUserRequest,
 )
-from app.models.responses import UserResponse
+from app.models.responses import (
+    LookupUsersResponse,
+    PartialUserResponse,
+    ScheduledUserDeletionResponse,
+    UserDeletionResponse,
+    UserResponse,
+    UserSearchItem,
+)
+from app.passwords import check_password, hash_password, needs_rehash
+from app.providers.use_admission_controller import use_admission_controller
 from app.providers.use_config import use_config
 from app.providers.use_email_service import use_email_service
+from app.providers.use_idempotency_store import use_idempotency_store
 from app.providers.use_logged_user import use_logged_user
+from app.providers.use_logged_user_document import use_logged_user_document
+from app.providers.use_logged_user_profile import use_logged_user_profile
+from app.providers.use_response_cache import use_response_cache
+from app.providers.use_user_deleter import use_user_deleter
+from app.user_deletion import UserDeleter
+from app.util.names import normalize_name, prefix_range
 
-users_router = APIRouter()
+users_router = APIRouter(route_class=DeadlineRoute)
 
 
-@users_router.get("/me", response_model=UserResponse)
-async def get_current_user(user: UserDocument = Depends(use_logged_user)):
-    return UserResponse.from_mongo(user)
+@users_router.get("/me", response_model=UserResponse | PartialUserResponse)
+async def get_current_user(
+    fields: Fields = Depends(fields_query(UserResponse)),
+    user: LoggedUserProfile = Depends(use_logged_user_profile),
+):
+    response = UserResponse.from_mongo(user)
+
+    if fields:
+        return JSONResponse(jsonable_encoder(response, include=set(fields)))
+
+    return response
+
 
+@users_router.get("/", response_model=LookupUsersResponse)
+async def lookup_users(ids: list[UUID] = Query()):
+    """
+    Get several users at once, in the order of `ids`. Ids not matching any user
+    are listed in `missing`.
+    """
+    # Duplicates are only returned once.
+    ids = list(dict.fromkeys(ids))
 
-@users_router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: UUID):
-    user = await UserDocument.get(user_id)
+    if len(ids) > USER_LOOKUP_LIMIT:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=f"At most {USER_LOOKUP_LIMIT} users can be requested at once.",
+        )
 
-    if not user:
+    users = await UserDocument.find(
+        {"_id": {"$in": ids}, "deletedAt": None}, projection_model=UserProfile
+    ).to_list()
+    users_by_id = {user.id: user for user in users}
+
+    return LookupUsersResponse(
+        data=[UserResponse.from_mongo(users_by_id[i]) for i in ids if i in users_by_id],
+        missing=[i for i in ids if i not in users_by_id],
+    )
+
+
+# Declared before `get_user` so "search" isn't taken for a user id.
+@users_router.get("/search", response_model=list[UserSearchItem])
+async def search_users(query: SearchUsersParams = Depends()):
+    """Find the users whose name starts with `prefix`, ignoring the case."""
+    users = (
+        await UserDocument.find(
+            {
+                "nameLower": prefix_range(normalize_name(query.prefix)),
+                "deletedAt": None,
+            },
+            projection_model=UserPreview,
+        )
+        .sort("nameLower")
+        .limit(query.limit)
+        .to_list()
+    )
+
+    return list(map(UserSearchItem.from_mongo, users))
+
+
+@users_router.get("/{user_id}", response_model=UserResponse | PartialUserResponse)
+async def get_user(
+    user_id: UUID,
+    fields: Fields = Depends(fields_query(UserResponse)),
+    config: Config = Depends(use_config),
+    cache: ResponseCache = Depends(use_response_cache),
+):
+    async def load():
+        user = await UserDocument.find_one({"_id": user_id, "deletedAt": None})
+        return UserResponse.from_mongo(user).json().encode() if user else None
+
+    content = await cache.get_or_load(
+        user_cache_key(user_id), load, config.cache.user_ttl
+    )
+
+    if not content:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="User not found.")
 
-    return UserResponse.from_mongo(user)
+    # The whole user is cached, so the requested fields are picked from it.
+    if fields:
+        return JSONResponse(trim_json(content, fields))
+
+    return Response(content=content, media_type="application/json")
 
 
 @users_router.post("/", response_model=UserResponse, status_code=HTTPStatus.CREATED)
 async def create_user(
     body: CreateUserRequest,
+    request: Request,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    config: Config = Depends(use_config),
+    admission: AdmissionController = Depends(use_admission_controller),
+    idempotency: IdempotencyStore = Depends(use_idempotency_store),
 ):
-    created_at = datetime.utcnow()
-    salt = bcrypt.gensalt()
-    password_hash = bcrypt.hashpw(body.password.encode(), salt)
-
-    user = UserDocument(
-        id=uuid4(),
-        email=body.email,
-        name=body.name,
-        passwordHash=password_hash,
-        verified=False,
-        createdAt=created_at,
-        updatedAt=created_at,
-    )
+    async def create() -> Response:
+        async with admission.admit(client=request.client.host, account=body.email):
+            password_hash = await hash_password(
+                body.password, config.password.bcrypt_rounds
+            )
+
+        created_at = datetime.utcnow()
+
+        user = UserDocument(
+            id=uuid4(),
+            email=body.email,
+            name=body.name,
+            nameLower=normalize_name(body.name) if body.name else None,
+            passwordHash=password_hash,
+            verified=False,
+            createdAt=created_at,
+            updatedAt=created_at,
+        )
 
-    try:
-        user = await user.insert()
-    except DuplicateKeyError as exc:
-        key, value = list(exc.details["keyValue"].items())[0]
-        detail = f"A user with '{key}'='{value}' already exists."
-        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=detail) from exc
+        document = get_dict(user, to_db=True)
 
-    return UserResponse.from_mongo(user)
+        # Beanie would store it as null, which the sparse `name_lower` index
+        # still indexes.
+        if user.nameLower is None:
+            del document["nameLower"]
+
+        try:
+            await UserDocument.get_motor_collection().insert_one(document)
+        except DuplicateKeyError as exc:
+            key, value = list(exc.details["keyValue"].items())[0]
+            detail = f"A user with '{key}'='{value}' already exists."
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=detail) from exc
+
+        return Response(
+            content=UserResponse.from_mongo(user).json(),
+            status_code=HTTPStatus.CREATED,
+            media_type="application/json",
+        )
+
+    # Scoped by the email so unrelated clients sending the same key don't share a
+    # record, while a retry with a different password is rejected. The password
+    # is only stored as part of a digest keyed with the JWT secret.
+    return await idempotency.run(
+        f"create_user:{body.email.lower()}",
+        idempotency_key,
+        request_fingerprint(body, secret=config.jwt.secret),
+        create,
+    )
 
 
 @users_router.patch("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: UUID,
     body: UpdateUserRequest,
-    user: UserDocument = Depends(use_logged_user),
+    logged_user: LoggedUser = Depends(use_logged_user),
+    cache: ResponseCache = Depends(use_response_cache),
 ):
-    if user_id != user.id:
+    if user_id != logged_user.id:
         raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED)
 
+    user = await use_logged_user_document(logged_user)
+
     user.updatedAt = datetime.now()
 
     if body.name is not None:
         user.name = body.name if body.name else None
+        user.nameLower = normalize_name(body.name) if body.name else None
 
     if body.email:
         user.email = body.email
         user.verified = False
 
+    changes = user.get_changes()
+    update = {"$set": changes}
+
+    # Unnamed users are left without `nameLower` so the sparse `name_lower`
+    # index skips them.
+    if "nameLower" in changes and changes["nameLower"] is None:
+        del changes["nameLower"]
+        update["$unset"] = {"nameLower": ""}
+
     try:
-        user = await user.save()
+        await user.update(update, skip_sync=True)
     except DuplicateKeyError as exc:
         key, value = list(exc.details["keyValue"].items())[0]
         detail = f"A user with '{key}'='{value}' already exists."
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=detail) from exc
 
+    await cache.invalidate(user_cache_key(user.id))
+
     return UserResponse.from_mongo(user)
 
 
+@users_router.delete(
+    "/{user_id}",
+    response_model=ScheduledUserDeletionResponse,
+    status_code=HTTPStatus.ACCEPTED,
+)
+async def delete_user(
+    user_id: UUID,
+    request: Request,
+    response: Response,
+    logged_user: LoggedUser = Depends(use_logged_user),
+    cache: ResponseCache = Depends(use_response_cache),
+    user_deleter: UserDeleter = Depends(use_user_deleter),
+):
+    """
+    Delete the account of the logged user. The user can't log in anymore once
+    this returns, while its posts are deleted in the background, see
+    `get_user_deletion` for the progress using the returned token.
+    """
+    if user_id != logged_user.id:
+        raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED)
+
+    # The job is created first so an interruption can't leave a deleted user with
+    # its content behind.
+    deletion = await user_deleter.schedule(user_id)
+
+    await UserDocument.find_one({"_id": user_id}).update(
+        {"$set": {"deletedAt": datetime.utcnow()}}
+    )
+    await cache.invalidate(user_cache_key(user_id))
+
+    user_deleter.start(user_id)
+
+    response.headers["Location"] = request.url_for("get_user_deletion", user_id=user_id)
+
+    return ScheduledUserDeletionResponse.from_mongo(deletion)
+
+
+@users_router.get("/{user_id}/deletion", response_model=UserDeletionResponse)
+async def get_user_deletion(user_id: UUID, deletion_token: UUID = Header()):
+    # Unknown tokens are answered like missing deletions, so the deletions of
+    # other users can't be looked up.
+    deletion = await UserDeletionDocument.find_one(
+        {"_id": user_id, "token": deletion_token}
+    )
+
+    if not deletion:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail="User deletion not found."
+        )
+
+    return UserDeletionResponse.from_mongo(deletion)
+
+
 @users_router.post("/login", response_model=UserResponse)
 async def login_user(
     body: LoginUserRequest,
+    request: Request,
     response: Response,
     config: Config = Depends(use_config),
+    admission: AdmissionController = Depends(use_admission_controller),
 ):
-    user = await UserDocument.find_one(
-        {"email": body.email} if body.email else {"name": body.name}
-    )
+    account = body.email or body.name
 
-    if not user:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="User not found.")
-
-    if not bcrypt.checkpw(body.password.encode(), user.passwordHash):
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED, detail="Invalid password."
+    async with admission.admit(client=request.client.host, account=account):
+        user = await UserDocument.find_one(
+            {"email": body.email} if body.email else {"name": body.name},
+            {"deletedAt": None},
         )
 
+        if not user:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND, detail="User not found."
+            )
+
+        if not await check_password(body.password, user.passwordHash):
+            raise HTTPException(
+                status_code=HTTPStatus.UNAUTHORIZED, detail="Invalid password."
+            )
+
+        # Transparently upgrade hashes created with a different work factor. The
+        # password update time is left untouched so issued tokens stay valid.
+        if needs_rehash(user.passwordHash, config.password.bcrypt_rounds):
+            password_hash = await hash_password(
+                body.password, config.password.bcrypt_rounds
+            )
+
+            await UserDocument.find_one(
+                {"_id": user.id, "passwordHash": user.passwordHash}
+            ).update({"$set": {"passwordHash": password_hash}})
+
     response.set_cookie(
         key="access_token",
         value=AccessToken.encode(user.id, config.jwt),
@@ -141,23 +362,49 @@ async def logout_user(response: Response):
     )
 
 
+async def create_user_code(user: UserDocument, code_type: UserCodeType, ttl: int):
+    # Only the last requested code is valid.
+    await UserCodeDocument.find({"userId": user.id, "type": code_type}).delete()
+
+    code = UserCodeDocument(
+        type=code_type,
+        userId=user.id,
+        expiresAt=datetime.utcnow() + timedelta(seconds=ttl),
+    )
+
+    return await code.insert()
+
+
+def check_user_code(code: UserCodeDocument | None, name: str):
+    if not code:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=f"No {name} requests found.",
+        )
+
+    # Mongo only removes expired documents periodically.
+    if code.expiresAt < datetime.utcnow():
+        raise HTTPException(
+            status_code=HTTPStatus.GONE, detail=f"{name.capitalize()} code has expired."
+        )
+
+
 @users_router.post("/verify", status_code=HTTPStatus.NO_CONTENT)
 async def request_email_verification(
     config: Config = Depends(use_config),
     email_service: EmailService = Depends(use_email_service),
-    user: UserDocument = Depends(use_logged_user),
+    user: UserDocument = Depends(use_logged_user_document),
 ):
-    user.verificationCode = uuid4()
-    user.verificationCodeIat = datetime.now()
-
-    await user.save()
+    code = await create_user_code(
+        user, UserCodeType.VERIFICATION, config.email.verification_expiration
+    )
 
     template_variables = {
         "title": "Email Confirmation",
         "description": "Confirm Your Email Address.",
         "base_url": config.website.base_url,
         "confirmation_url": reduce(
-            urljoin, [config.website.base_url, "verify/", str(user.verificationCode)]
+            urljoin, [config.website.base_url, "verify/", str(code.id)]
         ),
     }
 
@@ -172,34 +419,23 @@ async def request_email_verification(
 @users_router.post("/verify/{code}", response_model=UserResponse)
 async def verify_email(
     code: UUID,
-    user: UserDocument = Depends(use_logged_user),
-    config: Config = Depends(use_config),
+    user: UserDocument = Depends(use_logged_user_document),
+    cache: ResponseCache = Depends(use_response_cache),
 ):
-    if not user.verificationCode or not user.verificationCodeIat:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail="No account verification requests found.",
-        )
-
-    expiration_delta = timedelta(0, config.email.verification_expiration)
-    expiration = user.verificationCodeIat + expiration_delta
-
-    if expiration < datetime.now():
-        raise HTTPException(
-            status_code=HTTPStatus.GONE, detail="Verification code has expired."
-        )
+    document = await UserCodeDocument.get_motor_collection().find_one_and_delete(
+        {"_id": code, "type": UserCodeType.VERIFICATION, "userId": user.id}
+    )
 
-    if user.verificationCode != code:
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED, detail="Verification code is invalid."
-        )
+    check_user_code(
+        UserCodeDocument.parse_obj(document) if document else None,
+        "account verification",
+    )
 
     user.verified = True
     user.updatedAt = datetime.now()
-    user.verificationCode = None
-    user.verificationCodeIat = None
 
-    await user.save()
+    await user.save_changes()
+    await cache.invalidate(user_cache_key(user.id))
 
     return UserResponse.from_mongo(user)
 
@@ -208,19 +444,18 @@ async def verify_email(
 async def request_password_reset(
     config: Config = Depends(use_config),
     email_service: EmailService = Depends(use_email_service),
-    user: UserDocument = Depends(use_logged_user),
+    user: UserDocument = Depends(use_logged_user_document),
 ):
-    user.resetCode = uuid4()
-    user.resetCodeIat = datetime.now()
-
-    await user.save()
+    code = await create_user_code(
+        user, UserCodeType.PASSWORD_RESET, config.email.password_reset_expiration
+    )
 
     template_variables = {
         "title": "Password Reset",
         "description": "Reset your password.",
         "base_url": config.website.base_url,
         "confirmation_url": reduce(
-            urljoin, [config.website.base_url, "reset/", str(user.resetCode)]
+            urljoin, [config.website.base_url, "reset/", str(code.id)]
         ),
     }
 
@@ -236,34 +471,31 @@ async def request_password_reset(
 async def reset_password(
     code: UUID,
     body: ResetPasswordRequest,
-    user: UserDocument = Depends(use_logged_user),
+    request: Request,
+    user: UserDocument = Depends(use_logged_user_document),
     config: Config = Depends(use_config),
+    admission: AdmissionController = Depends(use_admission_controller),
+    cache: ResponseCache = Depends(use_response_cache),
 ):
-    if not user.resetCode or not user.resetCodeIat:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail="No password reset requests found.",
-        )
+    query = {"_id": code, "type": UserCodeType.PASSWORD_RESET, "userId": user.id}
 
-    expiration_delta = timedelta(0, config.email.password_reset_expiration)
-    expiration = user.resetCodeIat + expiration_delta
+    check_user_code(await UserCodeDocument.find_one(query), "password reset")
 
-    if expiration < datetime.now():
-        raise HTTPException(
-            status_code=HTTPStatus.GONE, detail="Reset code has expired."
+    async with admission.admit(client=request.client.host, account=str(user.id)):
+        password_hash = await hash_password(
+            body.password, config.password.bcrypt_rounds
         )
 
-    if user.resetCode != code:
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED, detail="Reset code is invalid."
-        )
+    # The code is only consumed once the new password is ready, deleting it
+    # makes sure concurrent requests can't use it more than once.
+    result = await UserCodeDocument.find_one(query).delete()
 
-    salt = bcrypt.gensalt()
+    if not result.deleted_count:
+        check_user_code(None, "password reset")
 
-    user.passwordHash = bcrypt.hashpw(body.password.encode(), salt)
+    user.passwordHash = password_hash
     user.passwordUpdatedAt = datetime.now()
     user.updatedAt = datetime.now()
-    user.resetCode = None
-    user.resetCodeIat = None
 
-    await user.save()
+    await user.save_changes()
+    await cache.invalidate(user_cache_key(user.id))
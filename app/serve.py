@@ -0,0 +1,190 @@
+"""
+Multi-process server running several uvicorn workers on a shared socket.
+
+The application is imported once before forking so the workers share its memory
+pages, while each worker creates its own database client on startup. Workers
+exceeding `SERVER_MAX_REQUESTS` exit gracefully and are replaced, and stopping
+the server forwards the signal to every worker. With the memory cache backend,
+the workers send each other the keys they invalidate so none of them keeps
+serving a changed post or user.
+
+Usage: python -m app.serve --host 0.0.0.0 --port 8000 [--workers 4]
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+import uvicorn
+
+from app import app
+from app.cache import InvalidationBroadcast
+from app.config import ServerConfig
+from app.providers.use_config import use_config
+from app.providers.use_response_cache import use_response_cache
+
+logger = logging.getLogger("uvicorn.error")
+
+# Minimum lifetime of a worker, workers crashing sooner are respawned with a delay
+# to avoid a busy loop when they can't start (e.g. the database is unreachable).
+MIN_WORKER_LIFETIME = 1  # seconds
+
+
+def available_cpus() -> int:
+    # The affinity mask takes container CPU limits into account on Linux.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+
+    return sock
+
+
+def run_worker(
+    sock: socket.socket,
+    args: argparse.Namespace,
+    config: ServerConfig,
+    broadcast_directory: str | None,
+):
+    # The parent signal handlers are inherited, uvicorn installs its own.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    if broadcast_directory:
+        broadcast = InvalidationBroadcast(broadcast_directory)
+        use_response_cache().share_invalidations(broadcast)
+
+    max_requests = None
+
+    if config.max_requests:
+        jitter = random.randint(0, config.max_requests_jitter)
+        max_requests = config.max_requests + jitter
+
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app,
+            proxy_headers=args.proxy_headers,
+            forwarded_allow_ips=args.forwarded_allow_ips,
+            limit_max_requests=max_requests,
+            log_level=args.log_level,
+        )
+    )
+    server.run(sockets=[sock])
+
+
+def spawn_worker(
+    sock: socket.socket,
+    args: argparse.Namespace,
+    config: ServerConfig,
+    broadcast_directory: str | None,
+) -> int:
+    pid = os.fork()
+
+    if pid == 0:
+        status = 1
+
+        try:
+            run_worker(sock, args, config, broadcast_directory)
+            status = 0
+        finally:
+            # Skip the cleanup inherited from the parent process.
+            os._exit(status)  # pylint: disable=protected-access
+
+    logger.info("Started worker process [%d]", pid)
+    return pid
+
+
+def main(args: argparse.Namespace):
+    config = use_config().server
+    workers = args.workers or config.workers or available_cpus()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    broadcast_directory = None
+
+    # Entries of the memory backend are per worker, so the invalidations have to
+    # be sent to the other workers. The redis backend is shared by all of them.
+    if workers > 1 and use_config().cache.backend == "memory":
+        broadcast_directory = tempfile.mkdtemp(prefix="biblion-cache-")
+
+    logger.info(
+        "Serving on http://%s:%d with %d workers", args.host, args.port, workers
+    )
+
+    started_at: dict[int, float] = {}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+        for pid in started_at:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        started_at[
+            spawn_worker(sock, args, config, broadcast_directory)
+        ] = time.monotonic()
+
+    while started_at:
+        pid, status = os.wait()
+        lifetime = time.monotonic() - started_at.pop(pid)
+
+        if stopping:
+            continue
+
+        exit_code = os.waitstatus_to_exitcode(status)
+
+        if exit_code:
+            logger.warning("Worker process [%d] exited with %d", pid, exit_code)
+
+            if lifetime < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+
+        # Workers also exit on their own after reaching `max_requests`.
+        started_at[
+            spawn_worker(sock, args, config, broadcast_directory)
+        ] = time.monotonic()
+
+    sock.close()
+
+    if broadcast_directory:
+        shutil.rmtree(broadcast_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, help="Number of workers (default: SERVER_WORKERS)."
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument(
+        "--proxy-headers", action=argparse.BooleanOptionalAction, default=True
+    )
+    parser.add_argument(
+        "--forwarded-allow-ips",
+        default="127.0.0.1",
+        help="Comma separated addresses of the proxies trusted with the proxy "
+        "headers, '*' to trust any (e.g. when only reachable through a proxy).",
+    )
+    parser.add_argument("--log-level", default="info")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    main(parser.parse_args())
@@ -0,0 +1,22 @@
+import argparse
+import asyncio
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+
+def run_tool(
+    main: Callable[[argparse.Namespace], Awaitable[None]],
+    parser: argparse.ArgumentParser,
+):
+    """Parse the command line arguments and run the given tool entry point."""
+    parser.add_argument(
+        "--env-file", help="Load the environment variables from the given file."
+    )
+
+    args = parser.parse_args()
+
+    if args.env_file:
+        load_dotenv(args.env_file)
+
+    asyncio.run(main(args))
@@ -0,0 +1,57 @@
+"""
+Find the bcrypt work factor that fits a target hashing latency on this machine.
+
+Run it on the same hardware as the production instances and set the result as
+`PASSWORD_BCRYPT_ROUNDS`, existing hashes are upgraded when users log in.
+
+Usage: python -m app.tools.calibrate_bcrypt --target-ms 250
+"""
+
+import argparse
+import time
+
+import bcrypt
+
+from app.tools import run_tool
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 20
+
+
+def measure(rounds: int, samples: int) -> float:
+    salt = bcrypt.gensalt(rounds)
+    start = time.perf_counter()
+
+    for _ in range(samples):
+        bcrypt.hashpw(b"calibration", salt)
+
+    return (time.perf_counter() - start) / samples * 1000
+
+
+async def main(args: argparse.Namespace):
+    selected = MIN_ROUNDS
+
+    # Each additional round doubles the cost, so we stop as soon as we go over.
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        latency = measure(rounds, args.samples)
+        print(f"rounds={rounds:<2} {latency:>9.1f}ms")
+
+        if latency > args.target_ms:
+            break
+
+        selected = rounds
+
+    print(f"PASSWORD_BCRYPT_ROUNDS={selected}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt work factor.")
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250,
+        help="Maximum time a single password hash may take.",
+    )
+    parser.add_argument("--samples", type=int, default=3)
+
+    run_tool(main, parser)
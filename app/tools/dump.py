@@ -0,0 +1,116 @@
+"""
+Dump the users and posts, along with the revisions of the posts, to compressed
+files restorable with `app.tools.restore`.
+
+Collections are dumped in parallel, a batch of documents at a time, so memory use
+doesn't grow with their size. The BSON format keeps the documents exactly as
+stored, while NDJSON uses MongoDB Extended JSON to keep the types (UUIDs, dates
+and binary data) and can be inspected with standard tools. Collections are not
+dumped from the same snapshot, pause writes for a consistent dump.
+
+Usage: python -m app.tools.dump backup/ [--format ndjson]
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import time
+from typing import Iterable
+
+from bson import json_util
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from bson.json_util import CANONICAL_JSON_OPTIONS
+from bson.raw_bson import RawBSONDocument
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.database import init_database
+from app.models.documents import PostDocument, PostRevisionDocument, UserDocument
+from app.providers.use_config import use_config
+from app.tools import run_tool
+
+DUMPED_MODELS = [UserDocument, PostDocument, PostRevisionDocument]
+
+FORMATS = ["bson", "ndjson"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+JSON_OPTIONS = CANONICAL_JSON_OPTIONS.with_options(
+    uuid_representation=UuidRepresentation.STANDARD
+)
+
+# Documents are read as raw BSON, they are never decoded when dumped as BSON.
+RAW_CODEC_OPTIONS = CodecOptions(
+    document_class=RawBSONDocument, uuid_representation=UuidRepresentation.STANDARD
+)
+
+
+def dump_path(directory: str, collection: str, dump_format: str) -> str:
+    return os.path.join(directory, f"{collection}.{dump_format}.gz")
+
+
+def encode(documents: Iterable[RawBSONDocument], dump_format: str) -> bytes:
+    if dump_format == "bson":
+        return b"".join(document.raw for document in documents)
+
+    return b"".join(
+        json_util.dumps(document, json_options=JSON_OPTIONS).encode() + b"\n"
+        for document in documents
+    )
+
+
+async def dump_collection(
+    collection: AsyncIOMotorCollection, args: argparse.Namespace
+) -> int:
+    path = dump_path(args.output, collection.name, args.format)
+    cursor = collection.with_options(codec_options=RAW_CODEC_OPTIONS).find(
+        batch_size=args.batch_size
+    )
+    count = 0
+
+    with gzip.open(path, "wb", compresslevel=args.compress_level) as file:
+        while documents := await cursor.to_list(args.batch_size):
+            # Encoding and compressing run on a thread so the collections are
+            # dumped in parallel.
+            data = await asyncio.to_thread(encode, documents, args.format)
+            await asyncio.to_thread(file.write, data)
+            count += len(documents)
+
+    return count
+
+
+async def main(args: argparse.Namespace):
+    config = use_config()
+
+    await init_database(config.database, sync_indexes=False)
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    collections = [model.get_motor_collection() for model in DUMPED_MODELS]
+    counts = await asyncio.gather(
+        *(dump_collection(collection, args) for collection in collections)
+    )
+    elapsed = time.perf_counter() - start
+
+    for collection, count in zip(collections, counts):
+        print(f"{collection.name:<16} {count:>10} documents")
+
+    total = sum(counts)
+    print(f"Dumped {total} documents in {elapsed:.1f}s ({total / elapsed:.0f}/s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump the users and posts.")
+    parser.add_argument("output", help="Directory the files are written to.")
+    parser.add_argument("--format", choices=FORMATS, default="bson")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        choices=range(1, 10),
+        default=6,
+        help="Gzip compression level, lower is faster.",
+    )
+
+    run_tool(main, parser)
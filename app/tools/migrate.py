@@ -0,0 +1,173 @@
+"""
+Synchronize the database indexes with the document models, clean up the fields
+left behind by previous versions and backfill the fields they didn't have.
+
+This needs to run once per deployment when starting the application with
+`DATABASE_SYNC_INDEXES=false`.
+
+Usage: python -m app.tools.migrate [--drop-indexes]
+"""
+
+import argparse
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database import init_database
+from app.models.documents import PostDocument, PostRevisionDocument, UserDocument
+from app.providers.use_config import use_config
+from app.revisions import build_revision
+from app.tools import run_tool
+from app.util.content import content_metadata
+from app.util.names import normalize_name
+
+BACKFILL_BATCH_SIZE = 1000
+
+DUPLICATE_KEY_ERROR = 11000
+
+LEGACY_USER_CODE_FIELDS = [
+    "verificationCode",
+    "verificationCodeIat",
+    "resetCode",
+    "resetCodeIat",
+]
+
+
+async def backfill_name_lower() -> int:
+    """Set the normalized name of the users created before it was introduced."""
+    collection = UserDocument.get_motor_collection()
+    cursor = collection.find(
+        {"name": {"$type": "string"}, "nameLower": {"$exists": False}},
+        {"name": 1},
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+    count = 0
+
+    while users := await cursor.to_list(BACKFILL_BATCH_SIZE):
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": user["_id"]},
+                    {"$set": {"nameLower": normalize_name(user["name"])}},
+                )
+                for user in users
+            ],
+            ordered=False,
+        )
+        count += len(users)
+
+    return count
+
+
+async def backfill_content_metadata(preview_length: int) -> int:
+    """Store the content metadata of the posts created before it was introduced."""
+    collection = PostDocument.get_motor_collection()
+    cursor = collection.find(
+        {"sizeBytes": {"$exists": False}},
+        {"content": 1},
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+    count = 0
+
+    while posts := await cursor.to_list(BACKFILL_BATCH_SIZE):
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": post["_id"]},
+                    {"$set": content_metadata(post["content"], preview_length)},
+                )
+                for post in posts
+            ],
+            ordered=False,
+        )
+        count += len(posts)
+
+    return count
+
+
+async def backfill_first_revisions(snapshot_interval: int) -> int:
+    """
+    Store the first revision of the posts created before revisions were
+    introduced, which don't have a `revision` number either.
+    """
+    collection = PostDocument.get_motor_collection()
+    cursor = collection.find(
+        {"revision": {"$exists": False}}, batch_size=BACKFILL_BATCH_SIZE
+    )
+    count = 0
+
+    while posts := await cursor.to_list(BACKFILL_BATCH_SIZE):
+        revisions = [
+            build_revision(PostDocument.parse_obj(post), None, snapshot_interval)
+            for post in posts
+        ]
+
+        try:
+            await PostRevisionDocument.insert_many(revisions, ordered=False)
+        except BulkWriteError as exc:
+            # Also stored by the updates of these posts.
+            if any(
+                error["code"] != DUPLICATE_KEY_ERROR
+                for error in exc.details["writeErrors"]
+            ):
+                raise
+
+        # Filtered on the missing number so the posts updated in the meantime
+        # keep theirs.
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": post["_id"], "revision": {"$exists": False}},
+                    {"$set": {"revision": 0}},
+                )
+                for post in posts
+            ],
+            ordered=False,
+        )
+        count += len(posts)
+
+    return count
+
+
+async def main(args: argparse.Namespace):
+    config = use_config()
+
+    await init_database(
+        config.database, sync_indexes=True, allow_index_dropping=args.drop_indexes
+    )
+
+    # One-time codes used to be stored on the users.
+    await UserDocument.get_motor_collection().update_many(
+        {"$or": [{field: {"$exists": True}} for field in LEGACY_USER_CODE_FIELDS]},
+        {"$unset": dict.fromkeys(LEGACY_USER_CODE_FIELDS, "")},
+    )
+
+    # Unnamed users used to be stored with a null `nameLower`, which the sparse
+    # `name_lower` index still indexes.
+    await UserDocument.get_motor_collection().update_many(
+        {"nameLower": {"$type": "null"}}, {"$unset": {"nameLower": ""}}
+    )
+
+    if backfilled := await backfill_name_lower():
+        print(f"Backfilled the normalized name of {backfilled} users.")
+
+    if backfilled := await backfill_content_metadata(config.posts.preview_length):
+        print(f"Backfilled the content metadata of {backfilled} posts.")
+
+    if backfilled := await backfill_first_revisions(
+        config.posts.revision_snapshot_interval
+    ):
+        print(f"Backfilled the first revision of {backfilled} posts.")
+
+    print(f"Indexes of database '{config.database.name}' are up to date.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synchronize the database indexes.")
+    parser.add_argument(
+        "--drop-indexes",
+        action="store_true",
+        help="Drop the indexes that are no longer declared by the document models.",
+    )
+
+    run_tool(main, parser)
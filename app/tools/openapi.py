@@ -0,0 +1,26 @@
+"""
+Write the OpenAPI schema of the application to a file.
+
+The Docker image runs this at build time and points `OPENAPI_SCHEMA_PATH` to the
+output so the schema doesn't have to be generated by each new instance.
+
+Usage: python -m app.tools.openapi openapi.json
+"""
+
+import argparse
+import json
+
+from app import app
+from app.tools import run_tool
+
+
+async def main(args: argparse.Namespace):
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(app.openapi(), file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the OpenAPI schema.")
+    parser.add_argument("output", help="Path of the output file.")
+
+    run_tool(main, parser)
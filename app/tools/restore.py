@@ -0,0 +1,164 @@
+"""
+Restore the users and posts dumped by `app.tools.dump`.
+
+Documents are inserted with concurrent unordered batches, and the indexes are
+only built once everything has been loaded since maintaining them during the
+inserts would slow the load down considerably. The collections have to be empty,
+or dropped beforehand with `--drop`.
+
+Usage: python -m app.tools.restore backup/ [--drop]
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import os
+import sys
+import time
+from typing import Iterator
+
+import bson
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.database import init_database
+from app.providers.use_config import use_config
+from app.tools import run_tool
+from app.tools.dump import (
+    DEFAULT_BATCH_SIZE,
+    DUMPED_MODELS,
+    FORMATS,
+    JSON_OPTIONS,
+    RAW_CODEC_OPTIONS,
+    dump_path,
+)
+
+
+def read_documents(path: str, dump_format: str) -> Iterator:
+    with gzip.open(path, "rb") as file:
+        if dump_format == "bson":
+            yield from bson.decode_file_iter(file, RAW_CODEC_OPTIONS)
+        else:
+            for line in file:
+                yield json_util.loads(line, json_options=JSON_OPTIONS)
+
+
+def next_batch(documents: Iterator, size: int) -> list:
+    return list(itertools.islice(documents, size))
+
+
+async def restore_collection(
+    collection: AsyncIOMotorCollection,
+    path: str,
+    dump_format: str,
+    args: argparse.Namespace,
+) -> int:
+    documents = read_documents(path, dump_format)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    inserts = set()
+    errors = []
+    count = 0
+
+    async def insert(batch: list):
+        try:
+            await collection.insert_many(batch, ordered=False)
+        except Exception as exception:  # pylint: disable=broad-except
+            errors.append(exception)
+        finally:
+            semaphore.release()
+
+    # Reading and decompressing run on a thread, while up to `concurrency` batches
+    # are being inserted. Waiting for a free slot before reading the next batch
+    # keeps the memory use constant.
+    while not errors:
+        await semaphore.acquire()
+        batch = await asyncio.to_thread(next_batch, documents, args.batch_size)
+
+        if not batch:
+            break
+
+        task = asyncio.create_task(insert(batch))
+        inserts.add(task)
+        task.add_done_callback(inserts.discard)
+        count += len(batch)
+
+    if inserts:
+        await asyncio.wait(inserts)
+
+    if errors:
+        raise errors[0]
+
+    return count
+
+
+def find_dump(directory: str, collection: str) -> tuple[str, str] | None:
+    for dump_format in FORMATS:
+        path = dump_path(directory, collection, dump_format)
+
+        if os.path.exists(path):
+            return path, dump_format
+
+    return None
+
+
+async def main(args: argparse.Namespace):
+    config = use_config()
+    database = await init_database(config.database, sync_indexes=False)
+
+    dumps = {}
+
+    for model in DUMPED_MODELS:
+        collection = model.get_motor_collection()
+        dump = find_dump(args.input, collection.name)
+
+        if not dump:
+            sys.exit(f"No dump found for '{collection.name}' in '{args.input}'.")
+
+        if args.drop:
+            await database.drop_collection(collection.name)
+        elif await collection.estimated_document_count():
+            sys.exit(f"'{collection.name}' is not empty, use --drop to replace it.")
+
+        dumps[collection] = dump
+
+    start = time.perf_counter()
+    counts = await asyncio.gather(
+        *(
+            restore_collection(collection, path, dump_format, args)
+            for collection, (path, dump_format) in dumps.items()
+        )
+    )
+    loaded = time.perf_counter()
+
+    await init_database(config.database, sync_indexes=True)
+    indexed = time.perf_counter()
+
+    for collection, count in zip(dumps, counts):
+        print(f"{collection.name:<16} {count:>10} documents")
+
+    total = sum(counts)
+    print(
+        f"Restored {total} documents in {loaded - start:.1f}s "
+        f"({total / (loaded - start):.0f}/s), "
+        f"built the indexes in {indexed - loaded:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restore the users and posts.")
+    parser.add_argument("input", help="Directory the dump was written to.")
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop the collections, along with their indexes, before restoring.",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of batches inserted at the same time per collection.",
+    )
+
+    run_tool(main, parser)
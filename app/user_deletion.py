@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import logging
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.cache import ResponseCache, post_cache_key, user_cache_key
+from app.config import UserDeletionConfig
+from app.metrics import Metrics
+from app.models.documents import (
+    PostDocument,
+    PostRevisionDocument,
+    UserCodeDocument,
+    UserDeletionDocument,
+    UserDeletionStatus,
+    UserDocument,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def discard_orphan_post(post_id: str, creator_id: UUID) -> bool:
+    """
+    Delete a post created by a user who has been deleted since it was
+    authenticated, as the deletion of its posts might have already gone past it.
+    Returns whether the post was deleted.
+    """
+    if await UserDocument.find({"_id": creator_id, "deletedAt": None}).count():
+        return False
+
+    # The revisions go first, like when deleting the posts in batches.
+    await PostRevisionDocument.find({"postId": post_id}).delete()
+    await PostDocument.find({"_id": post_id}).delete()
+
+    return True
+
+
+class UserDeleter:
+    """
+    Deletes the content of deleted users in the background, a batch of posts at
+    a time so no single query runs for long. Every step can safely be repeated,
+    so interrupted deletions are resumed from the start by the instance taking
+    over their lease, see `UserDeletionDocument`.
+    """
+
+    def __init__(
+        self, config: UserDeletionConfig, metrics: Metrics, cache: ResponseCache
+    ) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.cache = cache
+        self.tasks: dict[UUID, asyncio.Task] = {}
+        self.sweeper: asyncio.Task | None = None
+
+        metrics.register_gauge("user_deletions_running", lambda: len(self.tasks))
+
+    def lease_expiration(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.config.lease_timeout)
+
+    async def schedule(self, user_id: UUID) -> UserDeletionDocument:
+        """Create the deletion job of a user, or return the existing one."""
+        now = datetime.utcnow()
+        deletion = UserDeletionDocument(
+            id=user_id,
+            lockedUntil=self.lease_expiration(),
+            createdAt=now,
+            updatedAt=now,
+            token=uuid4(),
+        )
+
+        try:
+            return await deletion.insert()
+        except DuplicateKeyError:
+            return await UserDeletionDocument.get(user_id)
+
+    def start(self, user_id: UUID):
+        if user_id in self.tasks:
+            return
+
+        # Run in an empty context so the request deadline isn't inherited.
+        task = asyncio.create_task(self.run(user_id), context=contextvars.Context())
+        self.tasks[user_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(user_id, None))
+
+    async def claim(self, user_id: UUID) -> bool:
+        result = await UserDeletionDocument.get_motor_collection().update_one(
+            {
+                "_id": user_id,
+                "status": UserDeletionStatus.IN_PROGRESS,
+                "lockedUntil": {"$lte": datetime.utcnow()},
+            },
+            {"$set": {"lockedUntil": self.lease_expiration()}},
+        )
+
+        return result.modified_count == 1
+
+    async def delete_batch(self, user_id: UUID) -> bool:
+        """Delete a batch of posts of the user, returns `False` once none is left."""
+        posts = (
+            await PostDocument.get_motor_collection()
+            .find({"creator.$id": user_id}, {"_id": 1})
+            .limit(self.config.batch_size)
+            .to_list(None)
+        )
+        post_ids = [post["_id"] for post in posts]
+
+        if not post_ids:
+            return False
+
+        # The revisions go first, they couldn't be found anymore without the posts.
+        revisions = await PostRevisionDocument.find(
+            {"postId": {"$in": post_ids}}
+        ).delete()
+        deleted = await PostDocument.find({"_id": {"$in": post_ids}}).delete()
+        await self.cache.invalidate(*map(post_cache_key, post_ids))
+
+        await UserDeletionDocument.get_motor_collection().update_one(
+            {"_id": user_id},
+            {
+                "$inc": {
+                    "deletedPosts": deleted.deleted_count,
+                    "deletedRevisions": revisions.deleted_count,
+                },
+                "$set": {
+                    "lockedUntil": self.lease_expiration(),
+                    "updatedAt": datetime.utcnow(),
+                },
+            },
+        )
+
+        return True
+
+    async def run(self, user_id: UUID):
+        try:
+            while await self.delete_batch(user_id):
+                pass
+
+            await UserCodeDocument.find({"userId": user_id}).delete()
+            await UserDocument.find({"_id": user_id}).delete()
+            await self.cache.invalidate(user_cache_key(user_id))
+
+            now = datetime.utcnow()
+            await UserDeletionDocument.find_one({"_id": user_id}).update(
+                {
+                    "$set": {
+                        "status": UserDeletionStatus.COMPLETED,
+                        "updatedAt": now,
+                        "completedAt": now,
+                    }
+                }
+            )
+        except PyMongoError:
+            # Retried by the next sweep once the lease expires.
+            logger.exception("Failed to delete the content of user %s.", user_id)
+            self.metrics.increment("user_deletions_failed")
+            return
+
+        self.metrics.increment("user_deletions_completed")
+
+    async def sweep(self):
+        """Periodically resume the deletions abandoned by other instances."""
+        while True:
+            try:
+                abandoned = await UserDeletionDocument.find(
+                    {
+                        "status": UserDeletionStatus.IN_PROGRESS,
+                        "lockedUntil": {"$lte": datetime.utcnow()},
+                    }
+                ).to_list()
+
+                for deletion in abandoned:
+                    if deletion.id not in self.tasks and await self.claim(deletion.id):
+                        self.metrics.increment("user_deletions_resumed")
+                        self.start(deletion.id)
+            except PyMongoError:
+                logger.exception("Failed to look up abandoned user deletions.")
+
+            await asyncio.sleep(self.config.lease_timeout)
+
+    def ensure_sweeping(self):
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(
+                self.sweep(), context=contextvars.Context()
+            )
+
+    async def close(self):
+        tasks = list(self.tasks.values())
+
+        if self.sweeper:
+            tasks.append(self.sweeper)
+
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            await asyncio.wait(tasks)
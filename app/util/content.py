@@ -0,0 +1,18 @@
+def count_lines(content: str) -> int:
+    """Number of lines of the content, a trailing newline doesn't start a new one."""
+    if not content:
+        return 0
+
+    return content.count("\n") + (not content.endswith("\n"))
+
+
+def content_metadata(content: str, preview_length: int) -> dict:
+    """
+    Fields of a post derived from its content, stored alongside it so the posts
+    can be listed without fetching their content.
+    """
+    return {
+        "sizeBytes": len(content.encode()),
+        "lineCount": count_lines(content),
+        "preview": content[:preview_length],
+    }
@@ -0,0 +1,37 @@
+from difflib import SequenceMatcher
+
+# A delta is a list of `[start, end, text]` edits replacing the lines
+# `start:end` of the old text with `text`, sorted by position.
+Delta = list[list]
+
+
+def diff(old: str, new: str) -> Delta:
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, old_lines, new_lines)
+
+    return [
+        [start, end, "".join(new_lines[new_start:new_end])]
+        for tag, start, end, new_start, new_end in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def patch(old: str, delta: Delta) -> str:
+    lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+
+    for start, end, text in delta:
+        parts += lines[position:start]
+        parts.append(text)
+        position = end
+
+    parts += lines[position:]
+
+    return "".join(parts)
+
+
+def delta_size(delta: Delta) -> int:
+    """Approximate number of bytes taken by the delta once stored."""
+    return sum(len(text.encode()) + 16 for *_, text in delta)
@@ -0,0 +1,21 @@
+# Highest code point, strings starting with it can't be given an upper bound.
+MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize_name(name: str) -> str:
+    """Form of the user names used for case insensitive lookups."""
+    return name.lower()
+
+
+def prefix_range(prefix: str) -> dict:
+    """
+    Filter matching the strings starting with `prefix`, as a range which can be
+    scanned on an index, e.g. "ab" gives {"$gte": "ab", "$lt": "ac"}.
+    """
+    condition = {"$gte": prefix}
+    upper = prefix.rstrip(MAX_CHAR)
+
+    if upper:
+        condition["$lt"] = upper[:-1] + chr(ord(upper[-1]) + 1)
+
+    return condition
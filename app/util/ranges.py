@@ -0,0 +1,43 @@
+import re
+
+# Only single byte ranges are supported, e.g. "bytes=0-99", "bytes=100-" or
+# "bytes=-100" for the last 100 bytes.
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a `Range` header into the (inclusive) first and last byte positions.
+    Unsupported or malformed ranges return `None` so the whole content is served
+    instead, while ranges outside of the content raise `RangeNotSatisfiable`.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+
+    if not first:
+        # Suffix range with the number of bytes to serve from the end.
+        length = int(last)
+
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+
+    if end < start:
+        return None
+
+    return start, min(end, size - 1)
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.config import ViewsConfig
+from app.metrics import Metrics
+from app.models.documents import PostDocument
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Counts the views of the posts in memory and periodically adds them to the
+    posts with a single bulk write, so reading a post doesn't need a write.
+    Views are lost if the process is killed before they are flushed, and views of
+    new posts are dropped while `max_pending` posts are waiting to be flushed.
+    """
+
+    def __init__(self, config: ViewsConfig, metrics: Metrics) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.pending: dict[str, int] = {}
+        self.full = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+        metrics.register_gauge("post_views_pending", lambda: len(self.pending))
+
+    def record(self, post_id: str):
+        if post_id not in self.pending and len(self.pending) >= self.config.max_pending:
+            self.metrics.increment("post_views_dropped")
+            self.full.set()
+            return
+
+        self.pending[post_id] = self.pending.get(post_id, 0) + 1
+        self.ensure_flushing()
+
+    def ensure_flushing(self):
+        if self.task is None or self.task.done():
+            # Run in an empty context so the request deadline isn't inherited.
+            self.task = asyncio.create_task(self.run(), context=contextvars.Context())
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.full.clear()
+            # Not interrupted on shutdown, as the views being flushed would be lost.
+            await asyncio.shield(self.flush())
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+
+        if not pending:
+            return
+
+        operations = [
+            UpdateOne({"_id": post_id}, {"$inc": {"views": count}})
+            for post_id, count in pending.items()
+        ]
+
+        try:
+            # Unordered so the updates are sent as a single batch and one failing
+            # doesn't prevent the others.
+            await PostDocument.get_motor_collection().bulk_write(
+                operations, ordered=False
+            )
+        except PyMongoError:
+            # Retrying could count the views twice if they were partially applied.
+            logger.exception("Failed to flush the views of %d posts.", len(pending))
+            self.metrics.increment("post_views_lost", sum(pending.values()))
+            return
+
+        self.metrics.increment("post_views_flushed", sum(pending.values()))
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.wait([self.task])
+
+        await self.flush()
@@ -0,0 +1,258 @@
+"""
+Load and latency benchmark for the HTTP API.
+
+Seeds the benchmark database, drives the ASGI app with concurrent clients across
+the hot endpoints and writes throughput and latency percentiles to a JSON file so
+results can be compared between commits.
+
+Usage: python -m benchmarks.api_benchmark --users 10000 --posts 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+# The environment has to be loaded before importing the app since the
+# configuration is read from it. Values in .env.benchmark take precedence.
+load_dotenv(".env.benchmark")
+load_dotenv(".env.development")
+
+# pylint: disable=wrong-import-position
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, Response
+
+from app import app
+from app.access_token import AccessToken
+from app.models.documents import PostDocument, UserDocument
+from app.models.requests import GET_POSTS_PAGE_SIZE_LIMIT
+from app.providers.use_config import use_config
+from benchmarks.seed import BENCHMARK_PASSWORD, LANGUAGES, seed
+
+SAMPLE_SIZE = 1000
+
+Scenario = Callable[[AsyncClient], Awaitable[Response]]
+
+
+@dataclass
+class Fixtures:
+    post_ids: list[str]
+    user_ids: list
+    emails: list[str]
+    access_tokens: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Result:
+    requests: int = 0
+    errors: int = 0
+    latencies: list[float] = field(default_factory=list)
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+
+    index = max(0, min(len(values) - 1, round(rank / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(result: Result, elapsed: float) -> dict:
+    latencies = sorted(result.latencies)
+
+    return {
+        "requests": result.requests,
+        "errors": result.errors,
+        "throughput": result.requests / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "max": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def load_fixtures(args: argparse.Namespace) -> Fixtures:
+    if not args.skip_seed:
+        print(f"Seeding {args.users} users and {args.posts} posts...")
+        database = UserDocument.get_motor_collection().database
+        await seed(database, args.users, args.posts, random_seed=args.seed)
+
+    # Only verified users are allowed to create posts.
+    users_sample = await UserDocument.aggregate(
+        [
+            {"$match": {"verified": True}},
+            {"$sample": {"size": SAMPLE_SIZE}},
+            {"$project": {"email": 1}},
+        ]
+    ).to_list()
+    posts_sample = await PostDocument.aggregate(
+        [{"$sample": {"size": SAMPLE_SIZE}}, {"$project": {"_id": 1}}]
+    ).to_list()
+
+    config = use_config()
+    user_ids = [user["_id"] for user in users_sample]
+
+    return Fixtures(
+        post_ids=[post["_id"] for post in posts_sample],
+        user_ids=user_ids,
+        emails=[user["email"] for user in users_sample],
+        access_tokens=[AccessToken.encode(user_id, config.jwt) for user_id in user_ids],
+    )
+
+
+def build_scenarios(fixtures: Fixtures, skip_depths: list[int]) -> dict[str, Scenario]:
+    def auth_headers():
+        return {"Cookie": f"access_token={random.choice(fixtures.access_tokens)}"}
+
+    scenarios: dict[str, Scenario] = {
+        "get_post": lambda client: client.get(
+            f"/v1/posts/{random.choice(fixtures.post_ids)}"
+        ),
+        "get_posts_creator": lambda client: client.get(
+            "/v1/posts/",
+            params={
+                "limit": GET_POSTS_PAGE_SIZE_LIMIT,
+                "creatorId": str(random.choice(fixtures.user_ids)),
+            },
+        ),
+        "get_posts_language": lambda client: client.get(
+            "/v1/posts/",
+            params={
+                "limit": GET_POSTS_PAGE_SIZE_LIMIT,
+                "language": random.choice(LANGUAGES[1:]),
+            },
+        ),
+        "get_current_user": lambda client: client.get(
+            "/v1/users/me", headers=auth_headers()
+        ),
+        "search_users": lambda client: client.get(
+            "/v1/users/search", params={"prefix": f"user_{random.randint(1, 999)}"}
+        ),
+        "login_user": lambda client: client.post(
+            "/v1/users/login",
+            json={
+                "email": random.choice(fixtures.emails),
+                "password": BENCHMARK_PASSWORD,
+            },
+        ),
+        "create_post": lambda client: client.post(
+            "/v1/posts/",
+            json={"content": "x" * random.randint(16, 4096), "language": "txt"},
+            headers=auth_headers(),
+        ),
+    }
+
+    for skip in skip_depths:
+        scenarios[f"get_posts_skip_{skip}"] = lambda client, skip=skip: client.get(
+            "/v1/posts/", params={"limit": GET_POSTS_PAGE_SIZE_LIMIT, "skip": skip}
+        )
+
+    return scenarios
+
+
+async def run_scenario(
+    client: AsyncClient, scenario: Scenario, concurrency: int, duration: float
+) -> dict:
+    result = Result()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await scenario(client)
+            result.latencies.append(time.perf_counter() - start)
+            result.requests += 1
+
+            if response.status_code >= 400:
+                result.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return summarize(result, time.perf_counter() - start)
+
+
+def get_commit() -> str | None:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.stdout.strip()
+
+
+async def main(args: argparse.Namespace):
+    report = {
+        "commit": get_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "parameters": vars(args),
+        "scenarios": {},
+    }
+
+    client_config = {"app": app, "base_url": "https://biblion.io"}
+
+    async with AsyncClient(**client_config) as client, LifespanManager(app):
+        fixtures = await load_fixtures(args)
+        scenarios = build_scenarios(fixtures, args.skip_depths)
+        selected = args.scenarios or list(scenarios)
+
+        for name in selected:
+            summary = await run_scenario(
+                client, scenarios[name], args.concurrency, args.duration
+            )
+            report["scenarios"][name] = summary
+
+            print(
+                f"{name:<24} {summary['throughput']:>9.1f} req/s"
+                f"  p50 {summary['p50']:>8.2f}ms"
+                f"  p95 {summary['p95']:>8.2f}ms"
+                f"  p99 {summary['p99']:>8.2f}ms"
+                f"  errors {summary['errors']}"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"Results written to {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load and latency benchmark for the HTTP API."
+    )
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Seconds to run each scenario for."
+    )
+    parser.add_argument(
+        "--skip-depths",
+        type=lambda value: [int(skip) for skip in value.split(",")],
+        default=[0, 1_000, 10_000],
+        help="Comma separated list of skip values to benchmark get_posts with.",
+    )
+    parser.add_argument(
+        "--scenarios", nargs="*", help="Only run the given scenarios (default: all)."
+    )
+    parser.add_argument(
+        "--skip-seed", action="store_true", help="Reuse the existing database."
+    )
+    parser.add_argument("--output", default="benchmark.json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,136 @@
+"""
+Storage and reconstruction benchmark for the post revision history.
+
+Simulates posts edited many times with small random changes and compares the
+size of the stored revisions against keeping a full copy of every revision, along
+with the time it takes to rebuild a revision, for several snapshot intervals.
+Runs entirely in memory, no database is needed.
+
+Usage: python -m benchmarks.revisions_benchmark --revisions 200 --size 16384
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import bson
+
+from app.revisions import decode_content, encode_content
+from benchmarks.seed import generate_corpus
+
+
+def edit(rng: random.Random, content: str) -> str:
+    """Change a few lines of the content like a typical revision would."""
+    lines = content.splitlines(keepends=True)
+
+    for _ in range(rng.randint(1, 4)):
+        index = rng.randrange(len(lines))
+        action = rng.random()
+
+        if action < 0.5:
+            lines[index] = f"{lines[index].rstrip()} # {rng.getrandbits(32):x}\n"
+        elif action < 0.8:
+            lines.insert(index, f"value = {rng.getrandbits(32)}\n")
+        elif len(lines) > 1:
+            del lines[index]
+
+    return "".join(lines)
+
+
+def generate_history(rng: random.Random, size: int, revisions: int) -> list[str]:
+    history = [generate_corpus(rng, size)]
+
+    for _ in range(revisions - 1):
+        history.append(edit(rng, history[-1]))
+
+    return history
+
+
+def measure(history: list[str], snapshot_interval: int) -> dict:
+    stored = []
+
+    for number, content in enumerate(history):
+        previous = history[number - 1] if number else None
+        stored.append(
+            (number, *encode_content(number, content, previous, snapshot_interval))
+        )
+
+    stored_bytes = sum(
+        len(bson.encode({"content": content, "delta": delta}))
+        for _, content, delta in stored
+    )
+    full_bytes = sum(len(bson.encode({"content": content})) for content in history)
+
+    timings = []
+
+    for number, content in enumerate(history):
+        start = time.perf_counter()
+        base = number - number % snapshot_interval
+        rebuilt = decode_content(stored[base : number + 1])
+        timings.append(time.perf_counter() - start)
+
+        assert rebuilt == content
+
+    return {
+        "stored_bytes": stored_bytes,
+        "full_copy_bytes": full_bytes,
+        "ratio": stored_bytes / full_bytes,
+        "snapshots": sum(content is not None for _, content, _ in stored),
+        "rebuild_mean_ms": statistics.mean(timings) * 1000,
+        "rebuild_max_ms": max(timings) * 1000,
+    }
+
+
+def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    histories = [
+        generate_history(rng, args.size, args.revisions) for _ in range(args.posts)
+    ]
+    report = {"parameters": vars(args), "intervals": {}}
+
+    for interval in args.intervals:
+        results = [measure(history, interval) for history in histories]
+        stored_bytes = sum(result["stored_bytes"] for result in results)
+        full_bytes = sum(result["full_copy_bytes"] for result in results)
+        summary = {
+            "stored_bytes": stored_bytes,
+            "full_copy_bytes": full_bytes,
+            "ratio": stored_bytes / full_bytes,
+            "rebuild_mean_ms": statistics.mean(r["rebuild_mean_ms"] for r in results),
+            "rebuild_max_ms": max(r["rebuild_max_ms"] for r in results),
+        }
+        report["intervals"][interval] = summary
+
+        print(
+            f"interval {interval:>4}"
+            f"  storage {summary['stored_bytes'] / 1024:>10.1f}KiB"
+            f" ({summary['ratio']:.1%} of full copies)"
+            f"  rebuild mean {summary['rebuild_mean_ms']:>7.3f}ms"
+            f"  max {summary['rebuild_max_ms']:>7.3f}ms"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Revision history benchmark.")
+    parser.add_argument("--posts", type=int, default=10)
+    parser.add_argument("--revisions", type=int, default=200)
+    parser.add_argument("--size", type=int, default=16_384, help="Content size.")
+    parser.add_argument(
+        "--intervals",
+        type=lambda value: [int(interval) for interval in value.split(",")],
+        default=[1, 10, 20, 50],
+        help="Comma separated list of snapshot intervals.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--output", default="revisions_benchmark.json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,354 @@
+"""
+Bulk synthetic data loader for scale testing.
+
+Generates realistic user and post populations from a deterministic seed and loads
+them with parallel unordered `insert_many` batches. Documents are generated and
+encoded to BSON in worker processes, so the main process only ships raw bytes.
+
+Usage: python -m benchmarks.seed --users 100000 --posts 1000000 --seed 42
+"""
+
+import argparse
+import asyncio
+import itertools
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import bcrypt
+import bson
+from bson import DBRef
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+# The environment has to be loaded before importing the app since the
+# configuration is read from it. Values in .env.benchmark take precedence.
+load_dotenv(".env.benchmark")
+load_dotenv(".env.development")
+
+# pylint: disable=wrong-import-position
+from app.models.documents import (
+    DOCUMENT_MODELS,
+    PostDocument,
+    PostRevisionDocument,
+    UserDocument,
+)
+from app.models.requests import POST_CONTENT_MAX_LEN
+from app.providers.use_config import use_config
+from app.util.content import content_metadata
+from app.util.names import normalize_name
+from app.util.shortid import ALPHABET, DEFAULT_SIZE
+
+# Every seeded user shares the same password so we only pay for a single hash.
+BENCHMARK_PASSWORD = "benchmark"
+
+# Relative frequency of each language, `None` stands for plain text posts.
+LANGUAGE_WEIGHTS = {
+    None: 30,
+    "py": 15,
+    "js": 12,
+    "ts": 10,
+    "tsx": 6,
+    "jsx": 5,
+    "json": 5,
+    "go": 4,
+    "rs": 3,
+    "c": 3,
+    "sh": 3,
+    "sql": 2,
+    "md": 2,
+}
+LANGUAGES = list(LANGUAGE_WEIGHTS)
+
+VERIFIED_RATIO = 0.8
+NAMED_RATIO = 0.7
+NAMED_POST_RATIO = 0.6
+
+# Posts per user follow a Zipf distribution, so a few prolific users own a
+# large share of the posts like in the real world.
+POSTS_PER_USER_SKEW = 1.1
+
+# Content sizes are log-normally distributed around a few hundred bytes.
+CONTENT_SIZE_MU = math.log(600)
+CONTENT_SIZE_SIGMA = 1.2
+
+EPOCH = datetime(2020, 1, 1)
+TIMESPAN = timedelta(days=3 * 365)
+
+DEFAULT_BATCH_SIZE = 5_000
+
+DUPLICATE_KEY_ERROR = 11000
+
+CODEC_OPTIONS = CodecOptions(uuid_representation=UuidRepresentation.STANDARD)
+
+CODE_TOKENS = [
+    "const", "let", "def", "return", "if", "else", "for", "while", "import",
+    "from", "function", "class", "async", "await", "print", "value", "result",
+    "items", "index", "config", "user", "post", "=", "==", "+", "(", ")", "{",
+    "}", "[", "]", ":", ";", ",", "0", "1", "42", "'hello'", '"world"', "None",
+]  # fmt: skip
+
+
+class WorkerState:
+    """Generator process state, set up once by `init_worker`."""
+
+    user_ids: list[UUID] = []
+    user_weights: list[float] = []
+    corpus: str = ""
+    preview_length: int = 0
+
+
+def user_email(index: int) -> str:
+    return f"user{index}@benchmark.com"
+
+
+def generate_corpus(rng: random.Random, size: int) -> str:
+    """Build a block of code-looking text posts are sliced from."""
+    lines = []
+    length = 0
+
+    while length < size:
+        indent = "    " * rng.randint(0, 3)
+        line = indent + " ".join(rng.choices(CODE_TOKENS, k=rng.randint(1, 12)))
+        lines.append(line)
+        length += len(line) + 1
+
+    return "\n".join(lines)
+
+
+def init_worker(random_seed: int, users: int):
+    rng = random.Random(f"{random_seed}:user_ids")
+
+    WorkerState.user_ids = [
+        UUID(int=rng.getrandbits(128), version=4) for _ in range(users)
+    ]
+    WorkerState.user_weights = list(
+        itertools.accumulate(
+            1 / (rank + 1) ** POSTS_PER_USER_SKEW for rank in range(users)
+        )
+    )
+    WorkerState.corpus = generate_corpus(
+        random.Random(f"{random_seed}:corpus"), 2 * POST_CONTENT_MAX_LEN
+    )
+    WorkerState.preview_length = use_config().posts.preview_length
+
+
+def random_datetime(rng: random.Random, start: datetime = EPOCH) -> datetime:
+    end = EPOCH + TIMESPAN
+    seconds = rng.uniform(0, max(0.0, (end - start).total_seconds()))
+
+    # Mongo only stores millisecond precision.
+    return (start + timedelta(seconds=seconds)).replace(microsecond=0)
+
+
+def generate_users(
+    random_seed: int, start: int, stop: int, password_hash: bytes
+) -> list:
+    # Users ids are generated by `init_worker` so posts can reference them.
+    rng = random.Random(f"{random_seed}:users:{start}")
+    documents = []
+
+    for index in range(start, stop):
+        created_at = random_datetime(rng)
+        name = f"user_{index}" if rng.random() < NAMED_RATIO else None
+        document = {
+            "_id": WorkerState.user_ids[index],
+            "email": user_email(index),
+            "passwordHash": password_hash,
+            "name": name,
+            "verified": rng.random() < VERIFIED_RATIO,
+            "createdAt": created_at,
+            "updatedAt": random_datetime(rng, created_at),
+        }
+
+        # Left unset so the sparse `name_lower` index skips the unnamed users.
+        if name:
+            document["nameLower"] = normalize_name(name)
+
+        documents.append(bson.encode(document, codec_options=CODEC_OPTIONS))
+
+    return documents
+
+
+def generate_posts(random_seed: int, start: int, stop: int) -> list:
+    rng = random.Random(f"{random_seed}:posts:{start}")
+    creators = rng.choices(
+        WorkerState.user_ids, cum_weights=WorkerState.user_weights, k=stop - start
+    )
+    languages = rng.choices(
+        LANGUAGES, weights=LANGUAGE_WEIGHTS.values(), k=len(creators)
+    )
+    documents = []
+
+    for creator, language in zip(creators, languages):
+        size = min(
+            POST_CONTENT_MAX_LEN,
+            max(1, int(rng.lognormvariate(CONTENT_SIZE_MU, CONTENT_SIZE_SIGMA))),
+        )
+        offset = rng.randrange(len(WorkerState.corpus) - size)
+        content = WorkerState.corpus[offset : offset + size]
+        created_at = random_datetime(rng)
+        name = None
+
+        if rng.random() < NAMED_POST_RATIO:
+            name = f"snippet_{rng.getrandbits(32):x}.{language or 'txt'}"
+
+        document = {
+            # Random short ids drawn from the seeded generator, collisions are
+            # handled by the unordered inserts.
+            "_id": "".join(rng.choices(ALPHABET, k=DEFAULT_SIZE)),
+            "content": content,
+            **content_metadata(content, WorkerState.preview_length),
+            "name": name,
+            "language": language,
+            "createdAt": created_at,
+            "updatedAt": random_datetime(rng, created_at),
+            "creator": DBRef(UserDocument.Settings.name, creator),
+        }
+        documents.append(bson.encode(document, codec_options=CODEC_OPTIONS))
+
+    return documents
+
+
+async def insert_raw(collection, documents: list[bytes]) -> int:
+    raw = [RawBSONDocument(document, CODEC_OPTIONS) for document in documents]
+
+    try:
+        result = await collection.insert_many(raw, ordered=False)
+    except BulkWriteError as exception:
+        # Clashing short ids are skipped, every other error is fatal.
+        errors = exception.details["writeErrors"]
+
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+
+        return exception.details["nInserted"]
+
+    return len(result.inserted_ids)
+
+
+async def load(
+    collection,
+    pool: ProcessPoolExecutor,
+    batches: list[tuple],
+    concurrency: int,
+) -> int:
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def load_batch(function, *args) -> int:
+        async with semaphore:
+            documents = await loop.run_in_executor(pool, function, *args)
+            return await insert_raw(collection, documents)
+
+    counts = await asyncio.gather(*(load_batch(*batch) for batch in batches))
+    return sum(counts)
+
+
+async def create_indexes(database: AsyncIOMotorDatabase):
+    for model in DOCUMENT_MODELS:
+        indexes = getattr(model.Settings, "indexes", None)
+
+        if indexes:
+            await database[model.Settings.name].create_indexes(indexes)
+
+
+async def seed(
+    database: AsyncIOMotorDatabase,
+    users: int,
+    posts: int,
+    random_seed: int = 0,
+    workers: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict[str, float]:
+    """
+    Replace the contents of the users and posts collections with synthetic data
+    and return the number of inserted documents along with the elapsed time.
+    Indexes are built after loading since maintaining them during the bulk
+    inserts would slow the load down considerably.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    await database.drop_collection(UserDocument.Settings.name)
+    await database.drop_collection(PostDocument.Settings.name)
+    await database.drop_collection(PostRevisionDocument.Settings.name)
+
+    start = time.perf_counter()
+    password_hash = bcrypt.hashpw(BENCHMARK_PASSWORD.encode(), bcrypt.gensalt())
+
+    user_batches = [
+        (generate_users, random_seed, i, min(i + batch_size, users), password_hash)
+        for i in range(0, users, batch_size)
+    ]
+    post_batches = [
+        (generate_posts, random_seed, i, min(i + batch_size, posts))
+        for i in range(0, posts, batch_size)
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(random_seed, users)
+    ) as pool:
+        inserted_users, inserted_posts = await asyncio.gather(
+            load(database[UserDocument.Settings.name], pool, user_batches, workers),
+            load(database[PostDocument.Settings.name], pool, post_batches, workers),
+        )
+
+    loaded = time.perf_counter()
+    await create_indexes(database)
+
+    return {
+        "users": inserted_users,
+        "posts": inserted_posts,
+        "load_seconds": loaded - start,
+        "index_seconds": time.perf_counter() - loaded,
+    }
+
+
+async def main(args: argparse.Namespace):
+    config = use_config()
+    client = AsyncIOMotorClient(config.database.url, uuidRepresentation="standard")
+
+    print(f"Loading {args.users} users and {args.posts} posts...")
+
+    stats = await seed(
+        client[config.database.name],
+        args.users,
+        args.posts,
+        random_seed=args.seed,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+
+    documents = stats["users"] + stats["posts"]
+    rate = documents / stats["load_seconds"] * 60
+
+    print(
+        f"Inserted {stats['users']} users and {stats['posts']} posts"
+        f" in {stats['load_seconds']:.1f}s ({rate:,.0f} documents/minute),"
+        f" indexes built in {stats['index_seconds']:.1f}s"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk synthetic data loader.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--workers", type=int, help="Number of generator processes (default: CPUs)."
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,131 @@
+"""
+Startup time benchmark.
+
+Measures how long a fresh interpreter takes to import the application and how long
+a new server process takes until it serves its first request, both with the
+indexes synchronized on startup and with the synchronization deferred to
+`app.tools.migrate`.
+
+Usage: python -m benchmarks.startup_benchmark --runs 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from dotenv import dotenv_values
+
+IMPORT_SCRIPT = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+
+READY_TIMEOUT = 60
+
+
+def load_environment() -> dict[str, str]:
+    # Values in .env.benchmark take precedence like in the other benchmarks.
+    values = {**dotenv_values(".env.development"), **dotenv_values(".env.benchmark")}
+
+    return {
+        **{key: value for key, value in values.items() if value is not None},
+        **os.environ,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(environment: dict[str, str]) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        env=environment,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    return float(output.stdout.strip())
+
+
+def measure_ready(environment: dict[str, str]) -> float:
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        command, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+    try:
+        while time.perf_counter() - start < READY_TIMEOUT:
+            if process.poll() is not None:
+                raise RuntimeError(process.stderr.read().decode())
+
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/openapi.json")
+            except httpx.TransportError:
+                time.sleep(0.005)
+                continue
+
+            if response.status_code == 200:
+                return time.perf_counter() - start
+
+        raise TimeoutError("The server did not become ready in time.")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "mean": statistics.mean(samples) * 1000,
+        "min": min(samples) * 1000,
+        "max": max(samples) * 1000,
+    }
+
+
+def main(args: argparse.Namespace):
+    environment = load_environment()
+    modes = {
+        "sync_indexes": {**environment, "DATABASE_SYNC_INDEXES": "true"},
+        "deferred_indexes": {**environment, "DATABASE_SYNC_INDEXES": "false"},
+    }
+
+    report = {
+        "import": summarize([measure_import(environment) for _ in range(args.runs)]),
+        "ready": {},
+    }
+
+    for mode, mode_environment in modes.items():
+        samples = [measure_ready(mode_environment) for _ in range(args.runs)]
+        report["ready"][mode] = summarize(samples)
+
+    print(f"{'import':<24} {report['import']['mean']:>8.1f}ms")
+
+    for mode, summary in report["ready"].items():
+        print(f"{'ready (' + mode + ')':<24} {summary['mean']:>8.1f}ms")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Startup time benchmark.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="startup_benchmark.json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,136 @@
+"""
+Latency benchmark for the user name prefix search.
+
+Seeds the benchmark database with a large number of users, runs the query behind
+`GET /v1/users/search` for random prefixes of their names and reports the latency
+percentiles along with the query plan, which should be a bounded scan of the
+`name_lower` index whatever the number of users.
+
+Usage: python -m benchmarks.user_search_benchmark --users 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# The environment has to be loaded before importing the app since the
+# configuration is read from it. Values in .env.benchmark take precedence.
+load_dotenv(".env.benchmark")
+load_dotenv(".env.development")
+
+# pylint: disable=wrong-import-position
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+from app.models.documents import UserDocument
+from app.providers.use_config import use_config
+from app.util.names import normalize_name, prefix_range
+from benchmarks.api_benchmark import get_commit, percentile
+from benchmarks.seed import seed
+
+
+def search_query(collection: AsyncIOMotorCollection, prefix: str, limit: int):
+    # Same query as the `search_users` handler.
+    return (
+        collection.find(
+            {"nameLower": prefix_range(normalize_name(prefix)), "deletedAt": None},
+            {"name": 1},
+        )
+        .sort("nameLower")
+        .limit(limit)
+    )
+
+
+def random_prefix(rng: random.Random, users: int) -> str:
+    name = f"User_{rng.randrange(users)}"
+    return name[: rng.randint(len("User_") + 1, len(name))]
+
+
+def summarize_plan(explain: dict) -> dict:
+    stats = explain["executionStats"]
+    stages = []
+    stage = explain["queryPlanner"]["winningPlan"]
+
+    while stage:
+        stages.append(stage["stage"])
+        stage = stage.get("inputStage")
+
+    return {
+        "stages": stages,
+        "keys_examined": stats["totalKeysExamined"],
+        "documents_examined": stats["totalDocsExamined"],
+    }
+
+
+async def main(args: argparse.Namespace):
+    config = use_config()
+    client = AsyncIOMotorClient(config.database.url, uuidRepresentation="standard")
+    database = client[config.database.name]
+    collection = database[UserDocument.Settings.name]
+
+    if not args.skip_seed:
+        print(f"Seeding {args.users} users...")
+        await seed(database, args.users, 0, random_seed=args.seed)
+
+    rng = random.Random(args.seed)
+    prefixes = [random_prefix(rng, args.users) for _ in range(args.queries)]
+
+    # Warm up the connection pool and the index pages.
+    for prefix in prefixes[:100]:
+        await search_query(collection, prefix, args.limit).to_list(args.limit)
+
+    latencies = []
+
+    for prefix in prefixes:
+        start = time.perf_counter()
+        await search_query(collection, prefix, args.limit).to_list(args.limit)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    plan = summarize_plan(
+        await search_query(collection, "user_1", args.limit).explain()
+    )
+    report = {
+        "commit": get_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "parameters": vars(args),
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "max": latencies[-1] * 1000,
+        "plan": plan,
+    }
+
+    print(
+        f"search_users  p50 {report['p50']:.3f}ms  p95 {report['p95']:.3f}ms"
+        f"  p99 {report['p99']:.3f}ms  max {report['max']:.3f}ms"
+    )
+    print(
+        f"plan {' <- '.join(plan['stages'])}, {plan['keys_examined']} keys and"
+        f" {plan['documents_examined']} documents examined"
+    )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="User search latency benchmark.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument(
+        "--skip-seed", action="store_true", help="Reuse the existing database."
+    )
+    parser.add_argument("--output", default="user_search_benchmark.json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
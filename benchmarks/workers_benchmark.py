@@ -0,0 +1,138 @@
+"""
+Throughput scaling benchmark for the multi-process server.
+
+Starts `app.serve` with an increasing number of workers against the benchmark
+database (see `benchmarks.seed`) and measures the throughput of a few scenarios
+over real HTTP connections, reporting the speedup relative to a single worker.
+
+Usage: python -m benchmarks.workers_benchmark --workers 1,2,4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.api_benchmark import get_commit, run_scenario
+from benchmarks.seed import BENCHMARK_PASSWORD, LANGUAGES, user_email
+from benchmarks.startup_benchmark import READY_TIMEOUT, free_port, load_environment
+
+
+def build_scenarios(users: int) -> dict:
+    return {
+        "get_posts_language": lambda client: client.get(
+            "/v1/posts/", params={"language": random.choice(LANGUAGES[1:])}
+        ),
+        "login_user": lambda client: client.post(
+            "/v1/users/login",
+            json={
+                "email": user_email(random.randrange(users)),
+                "password": BENCHMARK_PASSWORD,
+            },
+        ),
+    }
+
+
+def start_server(environment: dict[str, str], workers: int, port: int):
+    command = [
+        sys.executable,
+        "-m",
+        "app.serve",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        command, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < READY_TIMEOUT:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi.json")
+            return process
+        except httpx.TransportError:
+            time.sleep(0.05)
+
+    process.terminate()
+    raise TimeoutError("The server did not become ready in time.")
+
+
+async def main(args: argparse.Namespace):
+    environment = load_environment()
+    scenarios = build_scenarios(args.users)
+    report = {
+        "commit": get_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "parameters": vars(args),
+        "workers": {},
+    }
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    for workers in args.workers:
+        port = free_port()
+        process = start_server(environment, workers, port)
+        report["workers"][workers] = {}
+
+        try:
+            for name, scenario in scenarios.items():
+                async with httpx.AsyncClient(
+                    base_url=f"http://127.0.0.1:{port}", limits=limits
+                ) as client:
+                    summary = await run_scenario(
+                        client, scenario, args.concurrency, args.duration
+                    )
+
+                baseline = report["workers"][args.workers[0]].get(name, summary)
+                summary["speedup"] = summary["throughput"] / (
+                    baseline["throughput"] or 1
+                )
+                report["workers"][workers][name] = summary
+
+                print(
+                    f"{workers:>3} workers  {name:<20}"
+                    f" {summary['throughput']:>9.1f} req/s"
+                    f"  x{summary['speedup']:.2f}"
+                    f"  p99 {summary['p99']:>8.2f}ms"
+                    f"  errors {summary['errors']}"
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Multi-process scaling benchmark.")
+    parser.add_argument(
+        "--workers",
+        type=lambda value: [int(workers) for workers in value.split(",")],
+        default=[1, 2, 4],
+        help="Comma separated list of worker counts, the first one is the baseline.",
+    )
+    parser.add_argument(
+        "--users", type=int, default=10_000, help="Number of seeded users."
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Seconds to run each scenario for."
+    )
+    parser.add_argument("--output", default="workers_benchmark.json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
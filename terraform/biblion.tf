@@ -22,6 +22,7 @@ locals {
   biblion_environment = {
     "WEBSITE_BASE_URL"                = var.website_base_url
     "DATABASE_NAME"                   = var.database_name
+    "DATABASE_SYNC_INDEXES"           = false
     "JWT_ALGORITHM"                   = var.jwt_algorithm
     "JWT_AUDIENCE"                    = var.jwt_audience
     "JWT_ISSUER"                      = var.jwt_issuer
@@ -128,6 +129,59 @@ resource "google_cloud_run_service" "biblion_service" {
   }
 }
 
+# The indexes are synchronized and the data migrated by running this job before
+# each deployment, instead of by every instance on startup.
+resource "google_cloud_run_v2_job" "biblion_migrate_job" {
+  depends_on = [google_project_iam_binding.cloud_run_secret_manager_admin_binding]
+  name       = "biblion-migrate-job"
+  location   = var.gcloud_region
+
+  template {
+    template {
+      service_account = google_service_account.cloud_run_service_account.email
+      max_retries     = 0
+
+      containers {
+        image   = "us-docker.pkg.dev/cloudrun/container/hello"
+        command = ["python", "-m", "app.tools.migrate"]
+
+        dynamic "env" {
+          for_each = local.biblion_environment
+
+          content {
+            name  = env.key
+            value = env.value
+          }
+        }
+
+        dynamic "env" {
+          for_each = google_secret_manager_secret_version.biblion_secrets
+
+          content {
+            name = local.biblion_secrets[env.key].name
+
+            value_source {
+              secret_key_ref {
+                secret  = google_secret_manager_secret.biblion_secrets[env.key].secret_id
+                version = env.value.version
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+
+  lifecycle {
+    ignore_changes = [
+      # Updated by the CI pipeline along with the image of the service.
+      template[0].template[0].containers[0].image,
+      client,
+      client_version,
+    ]
+  }
+}
+
 data "google_iam_policy" "biblion_service_policy" {
   binding {
     role    = "roles/run.invoker"
@@ -18,6 +18,10 @@ output "gcloud_service" {
   value = google_cloud_run_service.biblion_service.name
 }
 
+output "gcloud_migrate_job" {
+  value = google_cloud_run_v2_job.biblion_migrate_job.name
+}
+
 output "gcloud_region" {
   value = var.gcloud_region
 }
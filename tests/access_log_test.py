@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import logging
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from httpx import AsyncClient
+
+from app.access_log import (
+    AccessLog,
+    AccessLogMiddleware,
+    MongoCommandTimer,
+    RequestStats,
+    request_stats,
+)
+from app.config import AccessLogConfig
+from app.metrics import Metrics
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.entries: list[dict] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.entries.append(record.msg)
+
+
+def create_app(access_log: AccessLog) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(AccessLogMiddleware, get_access_log=lambda: access_log)
+
+    @app.get("/hello")
+    async def hello(request: Request):
+        request.state.user_id = "user"
+        return "hello"
+
+    @app.get("/fail")
+    async def fail():
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+
+    return app
+
+
+async def request_logs(sample_rate: float) -> list[dict]:
+    handler = ListHandler()
+    access_log = AccessLog(AccessLogConfig(sample_rate=sample_rate), Metrics(), handler)
+    access_log.start()
+
+    async with AsyncClient(
+        app=create_app(access_log), base_url="http://test"
+    ) as client:
+        await client.get("/hello")
+        await client.get("/fail")
+
+    access_log.stop()
+
+    return handler.entries
+
+
+@pytest.mark.asyncio
+async def test_access_log():
+    hello, fail = await request_logs(sample_rate=1)
+
+    assert hello["route"] == "hello"
+    assert hello["status"] == HTTPStatus.OK
+    assert hello["userId"] == "user"
+    assert hello["responseBytes"] == len(b'"hello"')
+    assert hello["sampled"] is True
+    assert fail["route"] == "fail"
+    assert fail["status"] == HTTPStatus.NOT_FOUND
+    assert fail["userId"] is None
+    assert fail["sampled"] is False
+
+
+@pytest.mark.asyncio
+async def test_access_log_sampling():
+    # Errors are logged regardless of the sample rate.
+    assert [entry["route"] for entry in await request_logs(sample_rate=0)] == ["fail"]
+
+
+@pytest.mark.asyncio
+async def test_mongo_command_timer():
+    timer = MongoCommandTimer()
+    stats = RequestStats()
+    request_stats.set(stats)
+
+    # Motor runs the commands on a thread pool within a copy of the context.
+    context = contextvars.copy_context()
+    await asyncio.get_running_loop().run_in_executor(
+        None, context.run, timer.record, 1500
+    )
+    timer.record(500)
+
+    assert stats.mongo_commands == 2
+    assert stats.mongo_time == pytest.approx(0.002)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import AdmissionController
+from app.config import PasswordConfig
+from app.metrics import Metrics
+from app.passwords import run_to_completion
+
+
+def create_controller(**config):
+    return AdmissionController(PasswordConfig(**config), Metrics())
+
+
+@pytest.mark.asyncio
+async def test_admission_global_concurrency():
+    controller = create_controller(max_concurrency=1)
+
+    async with controller.admit(client="1.1.1.1", account="mr_brown"):
+        with pytest.raises(HTTPException) as exception:
+            async with controller.admit(client="2.2.2.2", account="mr_green"):
+                pass
+
+    assert exception.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert exception.value.headers["Retry-After"] == "1"
+    assert controller.metrics.counters["password_operations_rejected_overload"] == 1
+
+    async with controller.admit(client="2.2.2.2", account="mr_green"):
+        assert controller.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_admission_account_concurrency():
+    controller = create_controller(account_concurrency=1)
+
+    async with controller.admit(client="1.1.1.1", account="mr_brown"):
+        with pytest.raises(HTTPException) as exception:
+            async with controller.admit(client="2.2.2.2", account="MR_BROWN"):
+                pass
+
+    assert exception.value.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_admission_client_rate():
+    controller = create_controller(client_rate=0.1, client_burst=2)
+
+    for _ in range(2):
+        async with controller.admit(client="1.1.1.1", account=None):
+            pass
+
+    with pytest.raises(HTTPException) as exception:
+        async with controller.admit(client="1.1.1.1", account=None):
+            pass
+
+    assert exception.value.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(exception.value.headers["Retry-After"]) > 1
+    assert controller.metrics.counters["password_operations_rejected_client"] == 1
+
+
+@pytest.mark.asyncio
+async def test_admission_held_until_hashing_finishes():
+    controller = create_controller()
+
+    async def hash_password():
+        async with controller.admit(client="1.1.1.1", account="mr_brown"):
+            await run_to_completion(time.sleep, 0.2)
+
+    task = asyncio.create_task(hash_password())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.sleep(0.05)
+
+    # The thread is still hashing, so the slot isn't released yet.
+    assert controller.in_flight == 1
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert controller.in_flight == 0
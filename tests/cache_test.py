@@ -0,0 +1,167 @@
+import asyncio
+import os
+
+import pytest
+
+from app.cache import (
+    InvalidationBroadcast,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    ResponseCache,
+)
+from app.metrics import Metrics
+
+
+async def serve_redis(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Minimal stand-in for a Redis server supporting GET, SET and DEL."""
+    data = {}
+
+    while line := await reader.readline():
+        args = []
+
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+
+        command, key, *rest = args
+
+        if command == b"GET":
+            value = data.get(key)
+            reply = f"${len(value)}\r\n".encode() + value if value else b"$-1"
+        elif command == b"SET":
+            data[key] = rest[0]
+            reply = b"+OK"
+        else:
+            reply = f":{sum(data.pop(k, None) is not None for k in args[1:])}".encode()
+
+        writer.write(reply + b"\r\n")
+        await writer.drain()
+
+
+@pytest.mark.asyncio
+async def test_cache_single_flight():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=8), Metrics())
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return b"value"
+
+    values = await asyncio.gather(
+        *(cache.get_or_load("post:a", load, 10) for _ in range(5))
+    )
+
+    assert values == [b"value"] * 5
+    assert loads == 1
+    assert await cache.get_or_load("post:a", load, 10) == b"value"
+    assert cache.metrics.counters["cache_post_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidate_during_load():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=8), Metrics())
+
+    async def load():
+        await cache.invalidate("post:a")
+        return b"stale"
+
+    assert await cache.get_or_load("post:a", load, 10) == b"stale"
+    assert await cache.backend.get("post:a") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_loader_cancelled():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=8), Metrics())
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.05)
+        return b"value"
+
+    loader = asyncio.create_task(cache.get_or_load("post:a", load, 10))
+    await asyncio.sleep(0.01)
+    waiters = [
+        asyncio.create_task(cache.get_or_load("post:a", load, 10)) for _ in range(2)
+    ]
+    await asyncio.sleep(0.01)
+    loader.cancel()
+
+    assert await asyncio.gather(*waiters) == [b"value"] * 2
+    assert loader.cancelled()
+    assert loads == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidate_backend_error():
+    class FailingBackend(MemoryCacheBackend):
+        async def delete(self, *keys: str):
+            raise ConnectionRefusedError()
+
+    cache = ResponseCache(FailingBackend(max_entries=8), Metrics())
+    await cache.invalidate("post:a")
+
+    assert cache.metrics.counters["cache_errors"] == 1
+
+
+def create_worker_cache(directory: str, pid: int, monkeypatch) -> ResponseCache:
+    # Each worker process listens on a socket named after its pid.
+    monkeypatch.setattr(os, "getpid", lambda: pid)
+    cache = ResponseCache(MemoryCacheBackend(max_entries=8), Metrics())
+    cache.share_invalidations(InvalidationBroadcast(directory))
+    cache.ensure_listening()
+
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidation_broadcast(tmp_path, monkeypatch):
+    first = create_worker_cache(str(tmp_path), 1, monkeypatch)
+    second = create_worker_cache(str(tmp_path), 2, monkeypatch)
+
+    await second.backend.set("post:a", b"value", 10)
+    await first.invalidate("post:a")
+    await asyncio.sleep(0.01)
+
+    assert await second.backend.get("post:a") is None
+
+    await second.close()
+    await first.invalidate("post:b")
+
+    # Workers remove their socket when shutting down.
+    assert os.listdir(tmp_path) == ["1.sock"]
+    assert "cache_invalidations_missed" not in first.metrics.counters
+
+    await first.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_memory_backend_eviction():
+    backend = MemoryCacheBackend(max_entries=2)
+
+    await backend.set("a", b"1", 10)
+    await backend.set("b", b"2", 10)
+    await backend.get("a")
+    await backend.set("c", b"3", 10)
+
+    assert await backend.get("a") == b"1"
+    assert await backend.get("b") is None
+
+    await backend.set("d", b"4", -1)
+    assert await backend.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_redis_backend():
+    server = await asyncio.start_server(serve_redis, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    backend = RedisCacheBackend(f"redis://127.0.0.1:{port}", pool_size=2)
+
+    async with server:
+        await backend.set("user:a", b"value", 10)
+        assert await backend.get("user:a") == b"value"
+        await backend.delete("user:a")
+        assert await backend.get("user:a") is None
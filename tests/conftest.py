@@ -3,6 +3,12 @@ from asgi_lifespan import LifespanManager
 from httpx import AsyncClient
 
 from app import app
+from app.providers.use_admission_controller import use_admission_controller
+from app.providers.use_idempotency_store import use_idempotency_store
+from app.providers.use_live_feed import use_live_feed
+from app.providers.use_response_cache import use_response_cache
+from app.providers.use_user_deleter import use_user_deleter
+from app.providers.use_view_counter import use_view_counter
 from tests.init_db import init_db
 from tests.test_access_tokens import test_access_tokens
 
@@ -19,6 +25,14 @@ async def app_client(request):
         access_token = test_access_tokens[request.param["logged_user"]]
         client_config["cookies"] = [("access_token", access_token)]
 
+    # Make sure no state is shared between tests.
+    use_admission_controller.cache_clear()
+    use_response_cache.cache_clear()
+    use_live_feed.cache_clear()
+    use_idempotency_store.cache_clear()
+    use_view_counter.cache_clear()
+    use_user_deleter.cache_clear()
+
     # Using LifespanManager to run the startup and shutdown events.
     # See https://github.com/tiangolo/fastapi/issues/2003#issuecomment-801140731
 
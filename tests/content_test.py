@@ -0,0 +1,18 @@
+from app.util.content import content_metadata, count_lines
+
+
+def test_count_lines():
+    assert count_lines("") == 0
+    assert count_lines("one") == 1
+    assert count_lines("one\n") == 1
+    assert count_lines("one\ntwo") == 2
+    assert count_lines("one\n\n") == 2
+
+
+def test_content_metadata():
+    assert content_metadata("print('héllo')\nexit()\n", 8) == {
+        "sizeBytes": 23,
+        "lineCount": 2,
+        "preview": "print('h",
+    }
+    assert content_metadata("", 8) == {"sizeBytes": 0, "lineCount": 0, "preview": ""}
@@ -0,0 +1,128 @@
+import asyncio
+from http import HTTPStatus
+
+import pymongo
+import pytest
+from fastapi import APIRouter, FastAPI
+from httpx import AsyncClient
+from pymongo import _csot  # pylint: disable=protected-access
+
+from app.deadlines import CLIENT_CLOSED_REQUEST, DeadlineRoute, run_past_deadline
+from app.providers.use_config import use_config
+from app.providers.use_metrics import use_metrics
+
+
+def create_app(events: list[str]) -> FastAPI:
+    router = APIRouter(route_class=DeadlineRoute)
+
+    @router.post("/sleep/{seconds}")
+    async def sleep(seconds: float, body: dict):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+        return body
+
+    app = FastAPI()
+    app.include_router(router)
+
+    return app
+
+
+@pytest.fixture(name="deadline")
+def fixture_deadline(monkeypatch: pytest.MonkeyPatch):
+    config = use_config().deadline
+    monkeypatch.setattr(config, "default", 10)
+    monkeypatch.setattr(config, "routes", {"sleep": 0.05})
+
+    return config
+
+
+@pytest.mark.asyncio
+async def test_deadline(deadline):
+    app = create_app([])
+    metrics = use_metrics()
+    exceeded = metrics.counters["requests_deadline_exceeded_sleep"]
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/sleep/0", json={"a": 1})
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == {"a": 1}
+
+        response = await client.post("/sleep/1", json={})
+        assert response.status_code == HTTPStatus.GATEWAY_TIMEOUT
+        assert metrics.counters["requests_deadline_exceeded_sleep"] == exceeded + 1
+
+        deadline.routes = {"sleep": 0}
+
+        response = await client.post("/sleep/0.1", json={})
+        assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_deadline_client_disconnect(deadline):
+    events = []
+    app = create_app(events)
+    deadline.routes = {}
+    messages = [
+        {"type": "http.request", "body": b"{}", "more_body": False},
+        {"type": "http.disconnect"},
+    ]
+    sent = []
+
+    async def receive():
+        message = messages.pop(0)
+
+        if message["type"] == "http.disconnect":
+            await asyncio.sleep(0.05)
+
+        return message
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/sleep/10",
+        "raw_path": b"/sleep/10",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+
+    await asyncio.wait_for(app(scope, receive, send), 1)
+
+    assert events == ["cancelled"]
+    assert sent[0]["status"] == CLIENT_CLOSED_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_run_past_deadline():
+    timeouts = []
+
+    async def write():
+        await asyncio.sleep(0.05)
+        timeouts.append(_csot.get_timeout())
+
+    async def request():
+        with pymongo.timeout(0.01):
+            await run_past_deadline(write())
+
+    task = asyncio.create_task(request())
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # The write isn't cancelled along with the request, nor bound by its timeout.
+    await asyncio.sleep(0.1)
+    assert timeouts == [None]
@@ -0,0 +1,51 @@
+import random
+
+from app.util.delta import diff, patch
+
+
+def edit(rng: random.Random, content: str) -> str:
+    lines = content.splitlines(keepends=True)
+
+    for _ in range(rng.randint(1, 5)):
+        index = rng.randint(0, len(lines))
+        action = rng.choice(["insert", "delete", "replace"])
+
+        if action == "insert" or not lines:
+            lines.insert(index, f"line {rng.random()}\n")
+        elif action == "delete":
+            del lines[min(index, len(lines) - 1)]
+        else:
+            lines[min(index, len(lines) - 1)] = f"changed {rng.random()}\n"
+
+    return "".join(lines)
+
+
+def test_patch_roundtrip():
+    rng = random.Random(0)
+    content = "".join(f"line {i}\n" for i in range(100))
+
+    for _ in range(200):
+        new_content = edit(rng, content)
+        assert patch(content, diff(content, new_content)) == new_content
+        content = new_content
+
+
+def test_patch_edge_cases():
+    cases = [
+        ("", "Hello, world!"),
+        ("Hello, world!", ""),
+        ("no trailing newline", "no trailing newline\n"),
+        ("a\r\nb\r\n", "a\nb\n"),
+        ("same\n", "same\n"),
+    ]
+
+    for old, new in cases:
+        assert patch(old, diff(old, new)) == new
+
+
+def test_diff_only_stores_changes():
+    content = "".join(f"line {i}\n" for i in range(1000))
+    new_content = content.replace("line 500\n", "line 500 changed\n")
+
+    assert diff(content, new_content) == [[500, 501, "line 500 changed\n"]]
+    assert diff(content, content) == []
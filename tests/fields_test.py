@@ -0,0 +1,74 @@
+from datetime import datetime
+from uuid import uuid4
+
+from bson import DBRef
+from fastapi import Depends, FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app.fields import (
+    Fields,
+    construct_partial,
+    fields_query,
+    partial_model,
+    projection_model,
+    trim_json,
+)
+from app.models.documents import PostDocument
+from app.models.responses import GetPostsItem
+
+
+def test_fields_query():
+    app = FastAPI()
+
+    @app.get("/")
+    async def get_fields(fields: Fields = Depends(fields_query(GetPostsItem))):
+        return fields
+
+    client = TestClient(app)
+
+    assert client.get("/").json() is None
+    assert client.get("/", params={"fields": "id,name,id"}).json() == ["id", "name"]
+    assert client.get("/", params={"fields": "id,content"}).status_code == 422
+    assert client.get("/", params={"fields": "id,"}).status_code == 422
+
+
+def test_projection_model():
+    model = projection_model(PostDocument, ("id", "creatorId", "views"))
+    creator_id = uuid4()
+    post = model.parse_obj({"_id": "a46yh2d3", "creator": DBRef("users", creator_id)})
+    partial = construct_partial(GetPostsItem, post)
+
+    # The views are missing from the document and get their default value.
+    assert jsonable_encoder(partial, include={"id", "creatorId", "views"}) == {
+        "id": "a46yh2d3",
+        "creatorId": str(creator_id),
+        "views": 0,
+    }
+
+
+def test_partial_model():
+    model = partial_model(GetPostsItem)
+    creator_id = uuid4()
+
+    assert model.__name__ == "PartialGetPostsItem"
+    assert model.parse_obj({"id": "a46yh2d3", "creatorId": str(creator_id)}) == model(
+        id="a46yh2d3", creatorId=creator_id
+    )
+
+
+def test_trim_json():
+    item = GetPostsItem(
+        id="a46yh2d3",
+        creatorId=uuid4(),
+        name="hello.txt",
+        language=None,
+        views=3,
+        createdAt=datetime(2022, 1, 1),
+        updatedAt=datetime(2022, 1, 2),
+    )
+
+    assert trim_json(item.json().encode(), ["name", "updatedAt"]) == {
+        "name": "hello.txt",
+        "updatedAt": "2022-01-02T00:00:00",
+    }
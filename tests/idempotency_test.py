@@ -0,0 +1,122 @@
+from datetime import datetime
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException, Response
+from pymongo.errors import AutoReconnect
+
+from app.config import IdempotencyConfig
+from app.idempotency import IdempotencyStore, request_fingerprint
+from app.metrics import Metrics
+from app.models.documents import IdempotentResponse
+from app.models.requests import CreateUserRequest
+
+
+def create_store(monkeypatch: pytest.MonkeyPatch, record=None):
+    store = IdempotencyStore(IdempotencyConfig(), Metrics())
+    completed = []
+    released = []
+
+    async def acquire(*_):
+        return record
+
+    async def complete(record_id: str, record: IdempotentResponse):
+        completed.append((record_id, record))
+
+    monkeypatch.setattr(store, "acquire", acquire)
+    monkeypatch.setattr(store, "complete", complete)
+    monkeypatch.setattr(store, "release", released.append)
+
+    return store, completed, released
+
+
+@pytest.mark.asyncio
+async def test_idempotency_transient_errors_release(monkeypatch: pytest.MonkeyPatch):
+    store, completed, released = create_store(monkeypatch)
+
+    async def handler():
+        raise HTTPException(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            detail="Too many password operations, please retry later.",
+            headers={"Retry-After": "1"},
+        )
+
+    with pytest.raises(HTTPException):
+        await store.run("create_user", "key", "fingerprint", handler)
+
+    assert released == ["create_user:key"]
+    assert not completed
+
+
+@pytest.mark.asyncio
+async def test_idempotency_stores_headers(monkeypatch: pytest.MonkeyPatch):
+    store, completed, released = create_store(monkeypatch)
+
+    async def handler():
+        return Response(
+            content="{}",
+            status_code=HTTPStatus.CREATED,
+            media_type="application/json",
+            headers={"Location": "/v1/posts/a46yh2d3"},
+        )
+
+    await store.run("create_post", "key", "fingerprint", handler)
+    _, record = completed[0]
+
+    assert not released
+    assert record.statusCode == HTTPStatus.CREATED
+    assert record.headers == {"location": "/v1/posts/a46yh2d3"}
+
+
+@pytest.mark.asyncio
+async def test_idempotency_replays_headers(monkeypatch: pytest.MonkeyPatch):
+    record = IdempotentResponse(
+        fingerprint="fingerprint",
+        statusCode=HTTPStatus.CREATED,
+        content="{}",
+        headers={"location": "/v1/posts/a46yh2d3"},
+        expiresAt=datetime.utcnow(),
+    )
+    store, _, _ = create_store(monkeypatch, record)
+
+    response = await store.run("create_post", "key", "fingerprint", None)
+
+    assert response.headers["Location"] == "/v1/posts/a46yh2d3"
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_idempotency_store_error(monkeypatch: pytest.MonkeyPatch):
+    store = IdempotencyStore(IdempotencyConfig(), Metrics())
+
+    async def acquire(*_):
+        return None
+
+    async def fail(*_):
+        raise AutoReconnect("connection closed")
+
+    async def handler():
+        return Response(
+            content="{}", status_code=HTTPStatus.CREATED, media_type="application/json"
+        )
+
+    monkeypatch.setattr(store, "acquire", acquire)
+    monkeypatch.setattr(store, "store", fail)
+
+    # The request was handled, so its response is returned regardless.
+    response = await store.run("create_post", "key", "fingerprint", handler)
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert store.metrics.counters["idempotency_store_failed"] == 1
+    assert await store.cache.get("create_post:key")
+
+
+def test_request_fingerprint_secret():
+    body = CreateUserRequest(email="test@gmail.com", password="banana")
+    fingerprint = request_fingerprint(body, secret="secret")
+
+    assert fingerprint == request_fingerprint(body, secret="secret")
+    assert fingerprint != request_fingerprint(body, secret="other")
+    assert fingerprint != request_fingerprint(
+        CreateUserRequest(email="test@gmail.com", password="manzana"), secret="secret"
+    )
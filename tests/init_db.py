@@ -1,9 +1,17 @@
 # pylint: disable=line-too-long
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from uuid import UUID
 
-from app.models.documents import PostDocument, UserDocument
+from app.models.documents import (
+    IdempotencyRecordDocument,
+    PostDocument,
+    PostRevisionDocument,
+    UserCodeDocument,
+    UserCodeType,
+    UserDeletionDocument,
+    UserDocument,
+)
 
 
 async def init_db():
@@ -12,7 +20,11 @@ async def init_db():
     Note: This should be called after the app startup event is executed.
     """
     await PostDocument.delete_all()
+    await PostRevisionDocument.delete_all()
     await UserDocument.delete_all()
+    await UserCodeDocument.delete_all()
+    await IdempotencyRecordDocument.delete_all()
+    await UserDeletionDocument.delete_all()
 
     await UserDocument.insert_many(
         [
@@ -21,6 +33,7 @@ async def init_db():
                 createdAt=datetime(2002, 10, 27, 2, 0, 0),
                 email="mrbrown@user.com",
                 name="mr_brown",
+                nameLower="mr_brown",
                 passwordHash=b"$2b$12$AccWeQEg2szEkty9YCWLa.1Y2snNhc.DTmk97Qveg8hpDgm9.O2kG",  # password: "hastasiempre"
                 updatedAt=datetime(2002, 10, 28, 14, 0, 0),
                 verified=True,
@@ -30,6 +43,7 @@ async def init_db():
                 createdAt=datetime(2002, 10, 27, 2, 0, 0),
                 email="mrgreen@user.com",
                 name="mr_green",
+                nameLower="mr_green",
                 passwordHash=b"$2b$12$tToXPOgFqXrqjuIdCXODZeXK0IfL.kz7sZ1/SxWRvN3Zn.TZYe7MW",  # password: "hastanunca"
                 updatedAt=datetime(2002, 10, 28, 14, 0, 0),
                 verified=False,
@@ -39,17 +53,31 @@ async def init_db():
                 createdAt=datetime(2002, 10, 22, 2, 0, 0),
                 email="mrred@user.com",
                 name="mr_red",
+                nameLower="mr_red",
                 passwordHash=b"$2b$12$yp9ipcT4VdpkMmwSNTaoied19ElSKuKtjeONj.7.nb5HUZllHvMx.",  # password: "hastacuando"
-                resetCode=UUID("6e94e45a-5f47-4b38-9483-6b1d5d57266b"),
-                resetCodeIat=datetime.now(),
                 updatedAt=datetime(2002, 11, 28, 14, 0, 0),
-                verificationCode=UUID("03d06d59-5fd5-4c49-bafe-91bab21d1391"),
-                verificationCodeIat=datetime.now(),
                 verified=False,
             ),
         ]
     )
 
+    await UserCodeDocument.insert_many(
+        [
+            UserCodeDocument(
+                id=UUID("03d06d59-5fd5-4c49-bafe-91bab21d1391"),
+                type=UserCodeType.VERIFICATION,
+                userId=UUID("af71f215-c3f8-441f-9498-e75f8dfbcf4b"),
+                expiresAt=datetime.utcnow() + timedelta(minutes=5),
+            ),
+            UserCodeDocument(
+                id=UUID("6e94e45a-5f47-4b38-9483-6b1d5d57266b"),
+                type=UserCodeType.PASSWORD_RESET,
+                userId=UUID("af71f215-c3f8-441f-9498-e75f8dfbcf4b"),
+                expiresAt=datetime.utcnow() + timedelta(minutes=5),
+            ),
+        ]
+    )
+
     await PostDocument.insert_many(
         [
             PostDocument(
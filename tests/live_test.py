@@ -0,0 +1,205 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from app import live
+from app.config import LiveConfig
+from app.live import LiveEvent, LiveFeed
+from app.metrics import Metrics
+from app.models.documents import PostDocument
+
+
+class FakeChangeStream:
+    def __init__(self, changes: list[dict], error: Exception | None = None) -> None:
+        self.changes = changes
+        self.error = error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if self.changes:
+            return self.changes.pop(0)
+
+        if self.error:
+            raise self.error
+
+        # Idle until cancelled.
+        return await asyncio.Future()
+
+    async def try_next(self) -> dict | None:
+        return self.changes.pop(0) if self.changes else None
+
+
+class FakeCollection:
+    def __init__(
+        self, changes: list[dict], errors: list[Exception] | None = None
+    ) -> None:
+        self.changes = changes
+        # Raised by the streams opened, once they run out of changes.
+        self.errors = errors or []
+        self.resume_tokens = []
+
+    def watch(self, *_, resume_after=None, **__) -> FakeChangeStream:
+        self.resume_tokens.append(resume_after)
+        return FakeChangeStream(
+            self.changes, self.errors.pop(0) if self.errors else None
+        )
+
+
+def create_feed(**config) -> LiveFeed:
+    feed = LiveFeed(LiveConfig(**config), Metrics())
+
+    # The change stream is replaced by calls to `publish`.
+    feed.ensure_watching = lambda: None
+
+    return feed
+
+
+def create_event(number: int, **fields) -> LiveEvent:
+    return LiveEvent(event_id=str(number), type="created", data="{}", **fields)
+
+
+async def read(stream, count: int) -> list[bytes]:
+    return [await anext(stream) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_live_feed_filters():
+    feed = create_feed()
+    creator_id = uuid4()
+    everything = feed.stream()
+    filtered = feed.stream(creator_id=creator_id, language="py")
+
+    assert await read(everything, 1) == [b": connected\n\n"]
+    assert await read(filtered, 1) == [b": connected\n\n"]
+
+    # Subscribers are registered once they start waiting for events.
+    events = asyncio.gather(read(everything, 3), read(filtered, 2))
+    await asyncio.sleep(0)
+
+    feed.publish(create_event(1, creator_id=creator_id, language="py"))
+    feed.publish(create_event(2, creator_id=uuid4(), language="py"))
+    feed.publish(LiveEvent(event_id="3", type="deleted", data="{}"))
+
+    received, received_filtered = await events
+
+    assert [data.split(b"\n")[0] for data in received] == [b"id: 1", b"id: 2", b"id: 3"]
+    assert [data.split(b"\n")[0] for data in received_filtered] == [b"id: 1", b"id: 3"]
+
+
+@pytest.mark.asyncio
+async def test_live_feed_replay():
+    feed = create_feed()
+
+    for number in range(5):
+        feed.publish(create_event(number))
+
+    stream = feed.stream(last_event_id="2")
+    received = await read(stream, 3)
+
+    assert received[1].startswith(b"id: 3\n")
+    assert received[2].startswith(b"id: 4\n")
+
+
+@pytest.mark.asyncio
+async def test_live_feed_resume(monkeypatch: pytest.MonkeyPatch):
+    feed = create_feed()
+
+    for number in range(10, 13):
+        feed.publish(create_event(number))
+
+    # Events older than the ones kept in memory come from a dedicated stream.
+    changes = [
+        {
+            "_id": {"_data": str(number)},
+            "operationType": "delete",
+            "documentKey": {"_id": f"post{number}"},
+        }
+        for number in range(6, 11)
+    ]
+    collection = FakeCollection(changes)
+    monkeypatch.setattr(PostDocument, "get_motor_collection", lambda: collection)
+
+    stream = feed.stream(last_event_id="5")
+    received = await read(stream, 8)
+
+    # Once it reaches an event kept in memory it joins the shared stream.
+    assert not feed.resuming
+    assert len(feed.subscribers) == 1
+
+    pending = asyncio.ensure_future(read(stream, 1))
+    await asyncio.sleep(0)
+    feed.publish(create_event(13))
+    received += await pending
+
+    ids = [data.split(b"\n")[0] for data in received[1:]]
+    assert ids == [f"id: {number}".encode() for number in range(6, 14)]
+
+
+@pytest.mark.asyncio
+async def test_live_feed_watch_errors(monkeypatch: pytest.MonkeyPatch):
+    feed = LiveFeed(LiveConfig(), Metrics())
+    change = {
+        "_id": {"_data": "1"},
+        "operationType": "delete",
+        "documentKey": {"_id": "post1"},
+    }
+    collection = FakeCollection(
+        [change],
+        [
+            OperationFailure("Interrupted.", code=11601),
+            OperationFailure("Resume point no longer in the oplog.", code=286),
+        ],
+    )
+    monkeypatch.setattr(PostDocument, "get_motor_collection", lambda: collection)
+    monkeypatch.setattr(live, "RETRY_DELAY", 0)
+
+    task = asyncio.create_task(feed.watch())
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    # Other errors resume after the last event, only a lost history resets it.
+    assert collection.resume_tokens == [None, {"_data": "1"}, None]
+    assert feed.metrics.counters["live_stream_errors"] == 1
+    assert feed.metrics.counters["live_stream_resets"] == 1
+    assert not feed.history
+
+
+@pytest.mark.asyncio
+async def test_live_feed_drops_slow_consumers():
+    feed = create_feed(buffer_size=2)
+    stream = feed.stream()
+
+    await read(stream, 1)
+    pending = asyncio.ensure_future(read(stream, 1))
+    await asyncio.sleep(0)
+
+    for number in range(5):
+        feed.publish(create_event(number))
+
+    assert feed.metrics.counters["live_subscribers_dropped"] == 1
+    assert not feed.subscribers
+
+    # The buffered events are still delivered before the stream ends.
+    received = [await pending] + [data async for data in stream]
+    assert len(received) == 2
+
+
+@pytest.mark.asyncio
+async def test_live_feed_heartbeat_and_close():
+    feed = create_feed(heartbeat=0.01)
+    stream = feed.stream()
+
+    assert await read(stream, 2) == [b": connected\n\n", b": heartbeat\n\n"]
+
+    await feed.close()
+    assert [data async for data in stream] == []
@@ -0,0 +1,56 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.loaders import UserLoader
+from app.models.documents import UserDocument, UserPreview
+
+
+class FakeQuery:
+    def __init__(self, users: list[UserPreview]) -> None:
+        self.users = users
+
+    async def to_list(self):
+        await asyncio.sleep(0)
+        return self.users
+
+
+@pytest.mark.asyncio
+async def test_user_loader_batches(monkeypatch: pytest.MonkeyPatch):
+    users = {
+        user_id: UserPreview(_id=user_id, name="test") for user_id in [uuid4(), uuid4()]
+    }
+    queries = []
+
+    def find(query, projection_model):
+        assert projection_model is UserPreview
+        assert query["deletedAt"] is None
+        queries.append(query["_id"]["$in"])
+        return FakeQuery([users[i] for i in query["_id"]["$in"] if i in users])
+
+    monkeypatch.setattr(UserDocument, "find", find)
+
+    loader = UserLoader()
+    first, second = users
+    missing = uuid4()
+
+    results = await loader.load_many([first, second, first, missing])
+
+    assert results == [users[first], users[second], users[first], None]
+    assert queries == [[first, second, missing]]
+
+    # Cached results don't trigger new queries.
+    assert await loader.load(second) == users[second]
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_loader_error(monkeypatch: pytest.MonkeyPatch):
+    def find(*_, **__):
+        raise RuntimeError("Database unavailable.")
+
+    monkeypatch.setattr(UserDocument, "find", find)
+
+    with pytest.raises(RuntimeError):
+        await UserLoader().load_many([uuid4(), uuid4()])
@@ -0,0 +1,32 @@
+from http import HTTPStatus
+
+import pytest
+from httpx import AsyncClient
+
+from app import app
+from app.providers.use_config import use_config
+
+
+@pytest.mark.asyncio
+async def test_metrics_token(monkeypatch: pytest.MonkeyPatch):
+    config = use_config().metrics
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        monkeypatch.setattr(config, "token", None)
+        response = await client.get("/metrics")
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        monkeypatch.setattr(config, "token", "secret")
+        response = await client.get("/metrics")
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        response = await client.get(
+            "/metrics", headers={"Authorization": "Bearer other"}
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        response = await client.get(
+            "/metrics", headers={"Authorization": "Bearer secret"}
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert isinstance(response.json(), dict)
@@ -0,0 +1,13 @@
+from app.util.names import MAX_CHAR, normalize_name, prefix_range
+
+
+def test_normalize_name():
+    assert normalize_name("Mr_Brown") == "mr_brown"
+    assert normalize_name("ÉLODIE") == "élodie"
+
+
+def test_prefix_range():
+    assert prefix_range("mr_b") == {"$gte": "mr_b", "$lt": "mr_c"}
+    assert prefix_range("z") == {"$gte": "z", "$lt": "{"}
+    assert prefix_range(f"a{MAX_CHAR}") == {"$gte": f"a{MAX_CHAR}", "$lt": "b"}
+    assert prefix_range(MAX_CHAR) == {"$gte": MAX_CHAR}
@@ -1,9 +1,14 @@
 from datetime import datetime
 from http import HTTPStatus
+from uuid import UUID
 
 import pytest
 from httpx import AsyncClient
 
+from app.models.documents import PostDocument, UserDocument
+from app.providers.use_view_counter import use_view_counter
+from app.routers import posts_router
+
 
 @pytest.mark.asyncio
 async def test_get_post(app_client: AsyncClient):
@@ -19,6 +24,19 @@ async def test_get_post(app_client: AsyncClient):
     assert json["language"] is None
     assert datetime.fromisoformat(json["createdAt"])
     assert datetime.fromisoformat(json["updatedAt"])
+    assert "creator" not in json
+
+
+@pytest.mark.asyncio
+async def test_get_post_expand_creator(app_client: AsyncClient):
+    response = await app_client.get("v1/posts/bdu764rt", params={"expand": "creator"})
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert json["creator"] == {
+        "id": "f4c8e142-5a8e-4759-9eec-74d9139dcfd5",
+        "name": "mr_brown",
+    }
 
 
 @pytest.mark.asyncio
@@ -27,6 +45,36 @@ async def test_get_post_non_existent(app_client: AsyncClient):
     assert response.status_code == HTTPStatus.NOT_FOUND
 
 
+@pytest.mark.asyncio
+async def test_get_post_raw(app_client: AsyncClient):
+    response = await app_client.get("v1/posts/bdu764rt/raw")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.text == "Hello, world!"
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert response.headers["Content-Length"] == "13"
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+    etag = response.headers["ETag"]
+
+    response = await app_client.get(
+        "v1/posts/bdu764rt/raw", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    response = await app_client.get(
+        "v1/posts/bdu764rt/raw", headers={"Range": "bytes=7-", "If-Range": etag}
+    )
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert response.text == "world!"
+    assert response.headers["Content-Range"] == "bytes 7-12/13"
+
+    response = await app_client.get(
+        "v1/posts/bdu764rt/raw", headers={"Range": "bytes=13-"}
+    )
+    assert response.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+
+
 @pytest.mark.asyncio
 async def test_get_posts(app_client: AsyncClient):
     response = await app_client.get("v1/posts", params={"limit": "32"})
@@ -37,6 +85,35 @@ async def test_get_posts(app_client: AsyncClient):
     assert json["totalCount"] == 4
     assert json["data"][0]["id"] == "ctrdg53d"
     assert json["data"][-1]["id"] == "bdu764rt"
+    assert all("creator" not in post for post in json["data"])
+
+
+@pytest.mark.asyncio
+async def test_get_posts_expand_creator(app_client: AsyncClient):
+    response = await app_client.get("v1/posts", params={"expand": "creator"})
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+
+    for post in json["data"]:
+        assert post["creator"]["id"] == post["creatorId"]
+        assert post["creator"]["name"] in {"mr_brown", "mr_green"}
+
+
+@pytest.mark.asyncio
+async def test_get_posts_most_viewed(app_client: AsyncClient):
+    for post_id in ["a46yh2d3", "a46yh2d3", "bdu764rt"]:
+        response = await app_client.get(f"v1/posts/{post_id}")
+        assert response.status_code == HTTPStatus.OK
+
+    await use_view_counter().flush()
+
+    response = await app_client.get("v1/posts", params={"sort": "views"})
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert [post["id"] for post in json["data"][:2]] == ["a46yh2d3", "bdu764rt"]
+    assert [post["views"] for post in json["data"][:2]] == [2, 1]
 
 
 @pytest.mark.asyncio
@@ -85,10 +162,61 @@ async def test_create_post(app_client: AsyncClient):
     assert len(json["id"]) > 0
     assert json["creatorId"] == "f4c8e142-5a8e-4759-9eec-74d9139dcfd5"
     assert json["content"] == "Test"
+    assert json["sizeBytes"] == 4
+    assert json["lineCount"] == 1
     assert datetime.fromisoformat(json["createdAt"])
     assert datetime.fromisoformat(json["updatedAt"])
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
+async def test_create_post_idempotency_key(app_client: AsyncClient):
+    headers = {"Idempotency-Key": "7a1c2b9e"}
+    response = await app_client.post(
+        "v1/posts", json={"content": "Test"}, headers=headers
+    )
+    assert response.status_code == HTTPStatus.CREATED
+
+    retry = await app_client.post("v1/posts", json={"content": "Test"}, headers=headers)
+    assert retry.status_code == HTTPStatus.CREATED
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == response.json()
+
+    response = await app_client.post(
+        "v1/posts", json={"content": "Other"}, headers=headers
+    )
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    response = await app_client.get(
+        "v1/posts", params={"creatorId": "f4c8e142-5a8e-4759-9eec-74d9139dcfd5"}
+    )
+    assert [post["content"] for post in response.json()["data"]].count("Test") == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
+async def test_create_post_creator_deleted(
+    app_client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+):
+    user_id = UUID("f4c8e142-5a8e-4759-9eec-74d9139dcfd5")
+    save_revision = posts_router.save_revision
+
+    # The user is deleted after being authenticated, while the post is created.
+    async def save_revision_and_delete_user(*args):
+        await save_revision(*args)
+        await UserDocument.find_one({"_id": user_id}).update(
+            {"$set": {"deletedAt": datetime.utcnow()}}
+        )
+
+    monkeypatch.setattr(posts_router, "save_revision", save_revision_and_delete_user)
+
+    count = await PostDocument.find({"creator.$id": user_id}).count()
+    response = await app_client.post("v1/posts", json={"content": "Test"})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert await PostDocument.find({"creator.$id": user_id}).count() == count
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("app_client", [{"logged_user": "mr_red"}], indirect=True)
 async def test_create_post_unverified(app_client: AsyncClient):
@@ -110,8 +238,49 @@ async def test_update_post(app_client: AsyncClient):
     assert json["content"] == "Hello, You!"
     assert json["name"] is None
     assert json["language"] is None
+    assert json["sizeBytes"] == 11
+    assert json["lineCount"] == 1
     assert datetime.fromisoformat(json["updatedAt"]) >= now
 
+    response = await app_client.get("v1/posts", params={"creatorId": json["creatorId"]})
+    post = next(post for post in response.json()["data"] if post["id"] == "bdu764rt")
+
+    assert "content" not in post
+    assert post["preview"] == "Hello, You!"
+    assert post["lineCount"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
+async def test_get_post_revisions(app_client: AsyncClient):
+    contents = ["Hello, world!"] + [f"Hello, world!\nEdit {i}\n" for i in range(3)]
+
+    for content in contents[1:]:
+        response = await app_client.put("v1/posts/bdu764rt", json={"content": content})
+        assert response.status_code == HTTPStatus.OK
+
+    assert response.json()["revision"] == 3
+
+    response = await app_client.get("v1/posts/bdu764rt/revisions")
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert [revision["number"] for revision in json] == [3, 2, 1, 0]
+
+    for number, content in enumerate(contents):
+        response = await app_client.get(f"v1/posts/bdu764rt/revisions/{number}")
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()["content"] == content
+
+
+@pytest.mark.asyncio
+async def test_get_post_revision_non_existent(app_client: AsyncClient):
+    response = await app_client.get("v1/posts/bdu764rt/revisions/1")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    response = await app_client.get("v1/posts/fakeid/revisions")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
@@ -0,0 +1,29 @@
+import pytest
+
+from app.util.ranges import RangeNotSatisfiable, parse_range
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=100-", 1000) == (100, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=900-2000", 1000) == (900, 999)
+    assert parse_range("bytes=-2000", 1000) == (0, 999)
+
+
+def test_parse_range_ignored():
+    assert parse_range("bytes=0-10,20-30", 1000) is None
+    assert parse_range("bytes=-", 1000) is None
+    assert parse_range("bytes=10-5", 1000) is None
+    assert parse_range("items=0-10", 1000) is None
+
+
+def test_parse_range_not_satisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-0", 1000)
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=0-10", 0)
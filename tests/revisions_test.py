@@ -0,0 +1,35 @@
+import pytest
+
+from app.revisions import MissingRevisionError, decode_content, encode_content
+
+LINES = [f"line {number}\n" for number in range(20)]
+
+CONTENTS = [
+    "".join(LINES),
+    "".join(LINES[:5] + ["edited\n"] + LINES[6:]),
+    "".join(LINES[:5] + ["edited\n"] + LINES[6:] + ["added\n"]),
+]
+
+
+def encode_revisions(contents: list[str]) -> list:
+    return [
+        (number, *encode_content(number, content, previous, snapshot_interval=10))
+        for number, (content, previous) in enumerate(zip(contents, [None] + contents))
+    ]
+
+
+def test_decode_content():
+    revisions = encode_revisions(CONTENTS)
+
+    for number, content in enumerate(CONTENTS):
+        assert decode_content(revisions[: number + 1]) == content
+
+    # Only the first revision is a snapshot.
+    assert decode_content(revisions[1:]) is None
+
+
+def test_decode_content_missing_revision():
+    revisions = encode_revisions(CONTENTS)
+
+    with pytest.raises(MissingRevisionError):
+        decode_content([revisions[0], revisions[2]])
@@ -7,6 +7,10 @@ import pytest
 import requests
 from httpx import AsyncClient
 
+from app.models.documents import UserDocument
+from app.providers.use_config import use_config
+from app.providers.use_user_deleter import use_user_deleter
+
 
 @pytest.mark.asyncio
 async def test_get_user(app_client: AsyncClient):
@@ -33,6 +37,39 @@ async def test_get_current_user(app_client: AsyncClient):
     assert json["id"] == "f4c8e142-5a8e-4759-9eec-74d9139dcfd5"
 
 
+@pytest.mark.asyncio
+async def test_lookup_users(app_client: AsyncClient):
+    ids = [
+        "34b8028f-a220-498e-85c9-7304e44cb272",
+        "00000000-0000-4000-8000-000000000000",
+        "f4c8e142-5a8e-4759-9eec-74d9139dcfd5",
+    ]
+    response = await app_client.get("v1/users/", params={"ids": ids})
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert [user["name"] for user in json["data"]] == ["mr_green", "mr_brown"]
+    assert json["missing"] == ["00000000-0000-4000-8000-000000000000"]
+
+
+@pytest.mark.asyncio
+async def test_search_users(app_client: AsyncClient):
+    response = await app_client.get("v1/users/search", params={"prefix": "MR_"})
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert [user["name"] for user in json] == ["mr_brown", "mr_green", "mr_red"]
+    assert set(json[0]) == {"id", "name"}
+
+    response = await app_client.get(
+        "v1/users/search", params={"prefix": "mr_", "limit": "1"}
+    )
+    assert [user["name"] for user in response.json()] == ["mr_brown"]
+
+    response = await app_client.get("v1/users/search", params={"prefix": "mr_z"})
+    assert response.json() == []
+
+
 @pytest.mark.asyncio
 async def test_create_user(app_client: AsyncClient):
     body = {"email": "test@gmail.com", "name": "mr_bean", "password": "banana"}
@@ -56,6 +93,31 @@ async def test_create_user_already_exists(app_client: AsyncClient):
     assert response.status_code == HTTPStatus.CONFLICT
 
 
+@pytest.mark.asyncio
+async def test_create_user_idempotency_key(app_client: AsyncClient):
+    body = {"email": "test@gmail.com", "name": "mr_bean", "password": "banana"}
+    headers = {"Idempotency-Key": "0f3b6d2a"}
+    response = await app_client.post("v1/users", json=body, headers=headers)
+    assert response.status_code == HTTPStatus.CREATED
+
+    # Without the key the retry would fail on the unique email.
+    retry = await app_client.post("v1/users", json=body, headers=headers)
+    assert retry.status_code == HTTPStatus.CREATED
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == response.json()
+
+    retry = await app_client.post(
+        "v1/users", json={**body, "password": "manzana"}, headers=headers
+    )
+    assert retry.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    # The same key sent by another client for another account isn't shared.
+    body = {"email": "other@gmail.com", "name": "mr_bin", "password": "banana"}
+    response = await app_client.post("v1/users", json=body, headers=headers)
+    assert response.status_code == HTTPStatus.CREATED
+    assert "Idempotent-Replayed" not in response.headers
+
+
 @pytest.mark.asyncio
 async def test_create_user_empty_name_no_conflict(app_client: AsyncClient):
     body = {"email": "mrblue@user.com", "password": "banana"}
@@ -156,6 +218,22 @@ async def test_login_user_with_email(app_client: AsyncClient):
     assert json["id"] == "f4c8e142-5a8e-4759-9eec-74d9139dcfd5"
 
 
+@pytest.mark.asyncio
+async def test_login_user_rehash(app_client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(use_config().password, "bcrypt_rounds", 4)
+
+    body = {"name": "mr_brown", "password": "hastasiempre"}
+    response = await app_client.post("v1/users/login", json=body)
+    assert response.status_code == HTTPStatus.OK
+
+    user = await UserDocument.find_one({"name": "mr_brown"})
+    assert user.passwordHash.startswith(b"$2b$04$")
+
+    # The password should still be valid after the upgrade.
+    response = await app_client.post("v1/users/login", json=body)
+    assert response.status_code == HTTPStatus.OK
+
+
 @pytest.mark.asyncio
 async def test_login_user_bad_credentials(app_client: AsyncClient):
     body = {"name": "mr_brown", "password": "hastasiempres"}
@@ -280,3 +358,49 @@ async def test_reset_password_no_request_found(app_client: AsyncClient):
     )
 
     assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
+async def test_delete_user(app_client: AsyncClient, monkeypatch: pytest.MonkeyPatch):
+    user_id = "f4c8e142-5a8e-4759-9eec-74d9139dcfd5"
+    monkeypatch.setattr(use_config().user_deletion, "batch_size", 1)
+
+    response = await app_client.delete(f"v1/users/{user_id}")
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert response.json()["status"] == "in_progress"
+    assert response.headers["Location"].endswith(f"/v1/users/{user_id}/deletion")
+
+    token = response.json()["token"]
+
+    # The user is rejected before its content is deleted.
+    response = await app_client.get("v1/users/me")
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    await asyncio.wait(list(use_user_deleter().tasks.values()))
+
+    response = await app_client.get(
+        f"v1/users/{user_id}/deletion",
+        headers={"Deletion-Token": "34b8028f-a220-498e-85c9-7304e44cb272"},
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    response = await app_client.get(
+        f"v1/users/{user_id}/deletion", headers={"Deletion-Token": token}
+    )
+    json = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert json["status"] == "completed"
+    assert json["deletedPosts"] == 2
+    assert await UserDocument.get(user_id) is None
+
+    response = await app_client.get("v1/posts", params={"creatorId": user_id})
+    assert response.json()["totalCount"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("app_client", [{"logged_user": "mr_brown"}], indirect=True)
+async def test_delete_other_user(app_client: AsyncClient):
+    response = await app_client.delete("v1/users/34b8028f-a220-498e-85c9-7304e44cb272")
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
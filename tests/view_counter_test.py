@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from pymongo import UpdateOne
+
+from app.config import ViewsConfig
+from app.metrics import Metrics
+from app.models.documents import PostDocument
+from app.view_counter import ViewCounter
+
+
+class FakeCollection:
+    def __init__(self) -> None:
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered):
+        assert not ordered
+        self.writes.append(operations)
+
+
+def increments(views: dict[str, int]) -> list[UpdateOne]:
+    return [
+        UpdateOne({"_id": post_id}, {"$inc": {"views": count}})
+        for post_id, count in views.items()
+    ]
+
+
+@pytest.fixture(name="collection")
+def fixture_collection(monkeypatch: pytest.MonkeyPatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(PostDocument, "get_motor_collection", lambda: collection)
+
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_view_counter_flush(collection: FakeCollection):
+    counter = ViewCounter(ViewsConfig(flush_interval=0.01), Metrics())
+
+    for post_id in ["a", "b", "a"]:
+        counter.record(post_id)
+
+    await asyncio.sleep(0.05)
+    counter.record("c")
+    await counter.close()
+
+    assert collection.writes == [increments({"a": 2, "b": 1}), increments({"c": 1})]
+
+
+@pytest.mark.asyncio
+async def test_view_counter_bounded(collection: FakeCollection):
+    counter = ViewCounter(ViewsConfig(max_pending=2), Metrics())
+
+    for post_id in ["a", "b", "c", "a"]:
+        counter.record(post_id)
+
+    assert counter.pending == {"a": 2, "b": 1}
+    assert counter.metrics.counters["post_views_dropped"] == 1
+
+    # Reaching the limit flushes the views early.
+    await asyncio.sleep(0.01)
+    assert collection.writes == [increments({"a": 2, "b": 1})]
+
+    await counter.close()